@@ -0,0 +1,106 @@
+import csv
+import random
+import argparse
+
+# Writes a synthetic CSV in the Food.com RAW_recipes.csv layout, so the
+# benchmarks run offline without the Kaggle download. Recipes are drawn
+# from a handful of cuisines that each have their own core ingredients
+# and tags, plus shared pantry staples, which gives search something
+# realistic to tell apart. The same seed always writes the same file.
+#
+#   python make_sample.py                      -> sample_recipes.csv (the bundled file)
+#   python make_sample.py --rows 200000 --out big.csv
+
+STAPLES = ["salt", "pepper", "olive oil", "butter", "sugar", "water", "flour", "eggs", "milk", "garlic",
+           "onion", "vegetable oil", "black pepper", "brown sugar", "lemon juice", "chopped onion",
+           "minced garlic", "baking powder", "salt & pepper", "parsley"]
+
+CUISINES = {
+    'italian': (["pasta", "parmesan cheese", "basil", "oregano", "mozzarella cheese", "diced tomatoes",
+                 "tomato paste", "ricotta cheese", "italian sausage", "spaghetti", "pine nuts", "balsamic vinegar",
+                 "sliced mushrooms", "crushed red pepper flakes", "prosciutto", "arborio rice", "marinara sauce",
+                 "fresh basil leaves", "lasagna noodles", "zucchini"],
+                ["italian", "european", "main-dish", "pasta-rice-and-grains"]),
+    'mexican': (["tortillas", "black beans", "cilantro", "lime", "cumin", "chili powder", "jalapeno",
+                 "salsa", "avocado", "cheddar cheese", "sour cream", "corn", "kidney beans", "ground beef",
+                 "enchilada sauce", "green chilies", "monterey jack cheese", "taco seasoning", "refried beans",
+                 "chipotle peppers"],
+                ["mexican", "north-american", "main-dish", "spicy"]),
+    'asian': (["soy sauce", "ginger", "sesame oil", "rice vinegar", "green onions", "rice", "tofu",
+               "hoisin sauce", "fish sauce", "bok choy", "cornstarch", "chicken breast", "snow peas",
+               "oyster sauce", "sriracha", "rice noodles", "coconut milk", "lemongrass", "shiitake mushrooms",
+               "bean sprouts"],
+              ["asian", "chinese", "thai", "stir-fry", "main-dish"]),
+    'indian': (["curry powder", "garam masala", "turmeric", "cumin seed", "coriander", "ghee", "lentils",
+                "chickpeas", "plain yogurt", "cardamom", "basmati rice", "ground ginger", "cayenne pepper",
+                "paneer", "spinach", "mustard seeds", "tomato puree", "cauliflower", "potatoes", "naan"],
+               ["indian", "asian", "curries", "spicy", "vegetarian"]),
+    'baking': (["all-purpose flour", "baking soda", "vanilla extract", "chocolate chips", "confectioners' sugar",
+                "cocoa powder", "cream cheese", "heavy cream", "cinnamon", "nutmeg", "walnuts", "pecans",
+                "shortening", "buttermilk", "honey", "raisins", "oats", "powdered sugar", "molasses",
+                "unsalted butter"],
+               ["desserts", "baking", "cookies-and-brownies", "cakes", "sweet"]),
+    'american': (["bacon", "ground turkey", "ketchup", "mustard", "mayonnaise", "worcestershire sauce",
+                  "bread crumbs", "cheddar cheese", "celery", "carrots", "chicken broth", "beef broth",
+                  "pork chops", "barbecue sauce", "potatoes", "green beans", "hamburger buns", "pickles",
+                  "dill", "paprika"],
+                 ["american", "north-american", "main-dish", "comfort-food", "easy"]),
+    'seafood': (["shrimp", "salmon", "tilapia", "crabmeat", "scallops", "white wine", "capers", "dill weed",
+                 "old bay seasoning", "tartar sauce", "lemon", "clams", "cod", "tuna", "mussels",
+                 "cocktail sauce", "lemon zest", "fresh dill", "halibut", "anchovies"],
+                ["seafood", "fish", "main-dish", "healthy", "low-fat"]),
+    'breakfast': (["maple syrup", "blueberries", "bananas", "yogurt", "granola", "bacon", "sausage",
+                   "english muffins", "hash browns", "orange juice", "strawberries", "pancake mix",
+                   "cinnamon", "ham", "swiss cheese", "bread", "cottage cheese", "peanut butter",
+                   "wheat germ", "applesauce"],
+                  ["breakfast", "brunch", "easy", "kid-friendly"]),
+}
+TIME_TAGS = ["15-minutes-or-less", "30-minutes-or-less", "60-minutes-or-less", "4-hours-or-less"]
+COMMON_TAGS = ["time-to-make", "course", "main-ingredient", "preparation", "occasion", "dietary",
+               "3-steps-or-less", "inexpensive", "for-1-or-2", "holiday-event"]
+STEPS = ["preheat oven to 350 degrees", "mix the dry ingredients together", "whisk in the wet ingredients",
+         "bring to a boil , then reduce heat", "simmer for 20 minutes", "season to taste",
+         "stir in the \"secret\" sauce", "bake until golden", "serve hot", "chop , then fry in batches",
+         "let cool before slicing", "garnish and serve"]
+
+
+def make_recipe(rng, i):
+    cuisine = rng.choice(list(CUISINES))
+    core, cuisine_tags = CUISINES[cuisine]
+    ingredients = rng.sample(core, rng.randint(3, 8)) + rng.sample(STAPLES, rng.randint(1, 5))
+    if rng.random() < 0.2:
+        # Some fusion, so cuisines overlap a little
+        ingredients += rng.sample(CUISINES[rng.choice(list(CUISINES))][0], rng.randint(1, 2))
+    ingredients = list(dict.fromkeys(ingredients))
+    rng.shuffle(ingredients)
+
+    minutes = rng.choice([10, 15, 25, 30, 45, 60, 90, 180])
+    tags = [tag for tag, limit in zip(TIME_TAGS, (15, 30, 60, 240)) if minutes <= limit][:1]
+    tags += rng.sample(cuisine_tags, rng.randint(1, len(cuisine_tags))) + rng.sample(COMMON_TAGS, rng.randint(2, 6))
+    steps = rng.sample(STEPS, rng.randint(2, 6))
+    name = f"{rng.choice(['easy', 'best', 'quick', 'grandma s', 'spicy', 'simple'])} {ingredients[0]} {cuisine} {i}"
+    description = "a family favorite,\nmade \"just right\"" if i % 7 == 0 else "simple and tasty"
+    return [name, 100000 + i * 3, minutes, rng.randint(1, 5000), "2005-01-01", repr(tags),
+            repr([round(rng.uniform(50, 900), 1)] + [round(rng.uniform(0, 80), 1) for _ in range(6)]),
+            len(steps), repr(steps), description, repr(ingredients), len(ingredients)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic RAW_recipes.csv")
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="sample_recipes.csv")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with open(args.out, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "id", "minutes", "contributor_id", "submitted", "tags", "nutrition",
+                         "n_steps", "steps", "description", "ingredients", "n_ingredients"])
+        for i in range(args.rows):
+            writer.writerow(make_recipe(rng, i))
+    print(f"Wrote {args.rows} recipes to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
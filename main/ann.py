@@ -0,0 +1,135 @@
+import numpy as np
+
+from search import l2_normalize, top_k
+
+# Approximate K-NN over the TF-IDF rows (IVF: inverted file of clusters).
+# TruncatedSVD squeezes the sparse rows into N_COMPONENTS dense dims,
+# k-means splits that space into lists, and a query only looks at the
+# rows of the nprobe lists whose centroids are closest to it. The
+# candidates are then rescored with exact TF-IDF cosine (rerank) or ranked
+# straight from the reduced vectors. nprobe is the recall/latency knob.
+
+N_COMPONENTS = 128
+DEFAULT_NPROBE = 8
+
+
+def _unit_rows(dense):
+    norms = np.linalg.norm(dense, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return dense / norms
+
+
+class AnnIndex:
+    """
+    Built with AnnIndex.fit(tfidf_matrix), persisted with save/load. Pass an
+    exact SearchIndex to search with reranking; it also supplies the row ids
+    and cluster labels, so search_queries() works with either index.
+    """
+
+    def __init__(self, components, centroids, vectors, order, offsets, exact=None, nprobe=DEFAULT_NPROBE):
+        self.components = components    # n_components x vocabulary, the SVD projection
+        self.centroids = centroids      # n_lists x n_components, unit length
+        self.vectors = vectors          # reduced unit rows, grouped by list
+        self.order = order              # corpus row of every entry in vectors
+        self.offsets = offsets          # list l holds vectors[offsets[l]:offsets[l + 1]]
+        self.nprobe = nprobe
+        self.exact = exact
+        if exact is not None:
+            self.ids = exact.ids
+            self.cluster_labels = exact.cluster_labels
+
+    def __len__(self):
+        return len(self.order)
+
+    @classmethod
+    def fit(cls, tfidf_matrix, n_components=N_COMPONENTS, n_lists=None, seed=42, **kwargs):
+        n_rows, n_terms = tfidf_matrix.shape
+        # TruncatedSVD needs fewer components than terms
+        n_components = max(1, min(n_components, n_terms - 1))
+        n_lists = n_lists or max(1, min(n_rows, int(4 * np.sqrt(n_rows))))
+        # Only fitting needs sklearn, a server loading ann.npz never imports it
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        svd = TruncatedSVD(n_components=n_components, random_state=seed)
+        reduced = _unit_rows(svd.fit_transform(l2_normalize(tfidf_matrix)).astype(np.float32))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3, batch_size=4096)
+        labels = kmeans.fit_predict(reduced)
+
+        index = cls(svd.components_.astype(np.float32), _unit_rows(kmeans.cluster_centers_.astype(np.float32)),
+                    np.empty((0, n_components), dtype=np.float32), np.empty(0, dtype=np.int64),
+                    np.zeros(n_lists + 1, dtype=np.int64), **kwargs)
+        index._store(reduced, labels, np.arange(n_rows))
+        return index
+
+    def _store(self, reduced, labels, rows):
+        order = np.argsort(labels, kind='stable')
+        self.vectors = reduced[order]
+        self.order = rows[order].astype(np.int64)
+        self.offsets = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1)).astype(np.int64)
+
+    def project(self, tfidf_rows):
+        return _unit_rows(np.asarray(l2_normalize(tfidf_rows) @ self.components.T, dtype=np.float32))
+
+    def add(self, tfidf_rows, first_row):
+        """
+        Files new corpus rows (first_row, first_row + 1, ...) under their
+        nearest list. The lists themselves are not refit.
+        """
+        reduced = self.project(tfidf_rows)
+        labels = np.argmax(reduced @ self.centroids.T, axis=1)
+        old_labels = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        self._store(np.vstack([self.vectors, reduced]), np.concatenate([old_labels, labels]),
+                    np.concatenate([self.order, np.arange(first_row, first_row + len(labels))]))
+
+    def candidates(self, query, nprobe):
+        """
+        Positions in self.vectors of every row in the nprobe closest lists.
+        """
+        centroid_scores = self.centroids @ query
+        nprobe = min(nprobe, len(centroid_scores))
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        starts, ends = self.offsets[lists], self.offsets[lists + 1]
+        lengths = ends - starts
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def search_batch(self, query_matrix, top_k_results=3, nprobe=None, rerank=None, rows=None):
+        """
+        Same contract as SearchIndex.search_batch: one (rows, scores) pair per
+        query, best first. rerank defaults to on when an exact index is set.
+        """
+        if rows is not None and self.exact is not None:
+            # A facet filter already cut the corpus down, score what's left exactly
+            return self.exact.search_batch(query_matrix, top_k_results, rows=rows)
+        nprobe = nprobe or self.nprobe
+        rerank = self.exact is not None if rerank is None else rerank
+        reduced = self.project(query_matrix)
+        if rerank:
+            exact_queries = l2_normalize(query_matrix).tocsr()
+
+        results = []
+        for q in range(reduced.shape[0]):
+            if not reduced[q].any():
+                # Nothing in the query is in the vocabulary
+                results.append((np.empty(0, dtype=np.int64), np.empty(0)))
+                continue
+            positions = self.candidates(reduced[q], nprobe)
+            if rows is not None:
+                positions = positions[np.isin(self.order[positions], rows)]
+            hits = self.order[positions]
+            if rerank:
+                scores = (self.exact.matrix[hits] @ exact_queries[q].T).toarray().ravel()
+            else:
+                scores = self.vectors[positions] @ reduced[q]
+            positive = scores > 0
+            results.append(top_k(hits[positive], scores[positive].astype(np.float64), top_k_results))
+        return results
+
+    def save(self, path):
+        np.savez(path, components=self.components, centroids=self.centroids, vectors=self.vectors,
+                 order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            return cls(data['components'], data['centroids'], data['vectors'], data['order'], data['offsets'], **kwargs)
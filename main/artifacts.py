@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+import scipy.sparse as sp
+
+import cache
+import query
+from ann import AnnIndex
+from export import iter_details, iter_ingredients, iter_tags
+from facets import FacetIndex
+from pantry import PantryIndex
+from store import write_store
+
+# Everything a search process needs, written next to the galaxy export:
+#   vocabulary.json, idf.npy, tfidf.npz   fitted TF-IDF stage (hashing engine: see hashing.py)
+#   reducer.pkl                           fitted UMAP reducer, for --append
+#   ann.npz                               optional IVF index for approximate search (see ann.py)
+#   neighbors.npz                         optional similar-recipes table (see neighbors.py)
+#   store/                                ids, coordinates, cluster ids, names, ingredients, steps (see store.py)
+#   pantry/                               ingredient bitsets for pantry-coverage ranking (see pantry.py)
+#   facets/                               tag and cluster posting lists for filtered search (see facets.py)
+#   manifest.json                         row count, params, palette, build version, source files
+
+
+def save_index(index_dir, vectorizer, tfidf_matrix, embedding_3d, cluster_ids, palette, spool, params,
+               sources=(), oov_rate=None, settings=None):
+    """
+    Persists the built galaxy so a server can load it without rerunning
+    the pipeline. spool is the JSON-lines spool written while ingesting,
+    sources the input files and limits the galaxy was built from, settings
+    the build flags a drift refit in append mode has to repeat.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    cache.write_tfidf(index_dir, vectorizer, tfidf_matrix)
+    write_store(os.path.join(index_dir, "store"), iter_details(spool), embedding_3d, cluster_ids)
+    PantryIndex.build(iter_ingredients(spool)).save(os.path.join(index_dir, "pantry"))
+    FacetIndex.build(iter_tags(spool), cluster_ids).save(os.path.join(index_dir, "facets"))
+    _write_manifest(index_dir, {
+        'count': len(cluster_ids),
+        'tfidf_params': params,
+        'palette': palette,
+        'version': f"{int(time.time())}-{len(cluster_ids)}",
+        'sources': list(sources),
+        'settings': dict(settings or {}),
+        # Share of feature tokens outside the vocabulary when it was fitted,
+        # the baseline append mode measures vocabulary drift against
+        'oov_rate': oov_rate,
+    })
+
+
+def append_index(index, tfidf_rows, embedding_rows, cluster_rows, spool, source):
+    """
+    Adds rows transformed with the saved vectorizer/reducer to a loaded
+    index. The store's string blob is appended to, the rest is rewritten.
+    """
+    index_dir = index['dir']
+    cache.write_tfidf(index_dir, index['vectorizer'], sp.vstack([index['tfidf_matrix'], tfidf_rows]).tocsr())
+    cluster_ids = np.concatenate([index['cluster_ids'], cluster_rows])
+    write_store(os.path.join(index_dir, "store"), iter_details(spool),
+                np.vstack([index['embedding'], embedding_rows]), cluster_ids, append=True)
+    index['pantry'].extend(iter_ingredients(spool))
+    index['pantry'].save(os.path.join(index_dir, "pantry"))
+    index['facets'].extend(iter_tags(spool), cluster_rows)
+    index['facets'].save(os.path.join(index_dir, "facets"))
+
+    manifest = dict(index['manifest'])
+    manifest.update({
+        'count': len(cluster_ids),
+        'version': f"{int(time.time())}-{len(cluster_ids)}",
+        'sources': manifest.get('sources', []) + [source],
+    })
+    _write_manifest(index_dir, manifest)
+    return cluster_ids
+
+
+def _write_manifest(index_dir, manifest):
+    # The manifest goes last, a reader never sees a count without its rows
+    with open(os.path.join(index_dir, "manifest.json"), mode="w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+
+
+def save_reducer(index_dir, reducer=None, cached_path=None):
+    """
+    Keeps the fitted UMAP reducer next to the index so new rows can be
+    projected later. A cache hit only has the pickle, which is copied as is.
+    """
+    path = os.path.join(index_dir, "reducer.pkl")
+    if reducer is not None:
+        cache.write_reducer(path, reducer)
+    elif cached_path is not None:
+        shutil.copyfile(cached_path, path)
+
+
+def load_reducer(index_dir):
+    path = os.path.join(index_dir, "reducer.pkl")
+    if not os.path.exists(path):
+        return None
+    return cache.read_reducer(path)
+
+
+def save_ann(index_dir, ann):
+    """
+    ann=None removes a stale index left by an earlier build.
+    """
+    path = os.path.join(index_dir, "ann.npz")
+    if ann is not None:
+        ann.save(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def load_ann(index_dir, **kwargs):
+    path = os.path.join(index_dir, "ann.npz")
+    if not os.path.exists(path):
+        return None
+    return AnnIndex.load(path, **kwargs)
+
+
+def save_neighbors(index_dir, neighbors):
+    """
+    neighbors is the (rows, scores) table, None removes a stale one.
+    """
+    path = os.path.join(index_dir, "neighbors.npz")
+    if neighbors is not None:
+        np.savez(path, rows=neighbors[0], scores=neighbors[1])
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def load_neighbors(index_dir):
+    path = os.path.join(index_dir, "neighbors.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data['rows'], data['scores']
+
+
+def load_index(index_dir):
+    """
+    query.load_index with the fitted sklearn vectorizer restored, which
+    append mode needs to featurize new rows.
+    """
+    return query.load_index(index_dir, read_tfidf=cache.read_tfidf)
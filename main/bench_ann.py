@@ -0,0 +1,85 @@
+import argparse
+import time
+import numpy as np
+
+from ann import AnnIndex, N_COMPONENTS
+from bench_search import make_queries
+from features import featurize_chunk, fit_tfidf
+from ingest import iter_chunks, iter_recipes
+from search import SearchIndex, l2_normalize
+
+
+def recall_at_k(exact, approx, queries, index):
+    """
+    Mean share of the exact top-k the approximate search matched. Recipes
+    often tie on score, so an approximate hit counts when its exact score
+    reaches the exact k-th best, whichever of the tied rows it picked.
+    Queries with no exact match at all are skipped.
+    """
+    recalls = []
+    for q, ((rows, scores), (approx_rows, _)) in enumerate(zip(exact, approx)):
+        if not len(rows):
+            continue
+        approx_scores = (index.matrix[approx_rows] @ l2_normalize(queries[q]).T).toarray().ravel()
+        recalls.append(min(np.sum(approx_scores >= scores[-1] - 1e-9), len(rows)) / len(rows))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def timed(search, query_matrix, top_k, **kwargs):
+    # One query at a time, like a server without batching
+    latencies, results = [], []
+    for q in range(query_matrix.shape[0]):
+        start = time.perf_counter()
+        results.extend(search(query_matrix[q], top_k, **kwargs))
+        latencies.append(time.perf_counter() - start)
+    return results, np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of the IVF index against exact search")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--components", type=int, default=N_COMPONENTS)
+    parser.add_argument("--lists", type=int, default=0, help="0 = 4 * sqrt(rows)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print("Vectorizing")
+    master_features = []
+    for chunk in iter_chunks(args.data, 10000, args.limit or None):
+        master_features.extend(featurize_chunk(chunk)[0])
+    vectorizer, tfidf_matrix = fit_tfidf(master_features)
+    del master_features
+
+    exact = SearchIndex(tfidf_matrix)
+    start = time.perf_counter()
+    ann = AnnIndex.fit(tfidf_matrix, n_components=args.components, n_lists=args.lists or None, exact=exact)
+    print(f"IVF index over {len(ann)} recipes: {ann.components.shape[0]} dims, {len(ann.centroids)} lists, "
+          f"built in {time.perf_counter() - start:.1f}s")
+
+    # Pantry queries plus whole recipes used as "more like this" queries
+    recipes = list(iter_recipes(args.data, min(args.limit or 20000, 20000)))
+    rng = np.random.default_rng(42)
+    pantry = vectorizer.transform(make_queries(recipes, args.queries // 2))
+    like_this = tfidf_matrix[rng.choice(tfidf_matrix.shape[0], args.queries - args.queries // 2, replace=False)]
+
+    print(f"\n{'ENGINE':<26} | {'RECALL@' + str(args.top_k):<9} | {'p50 (ms)':<8} | {'p99 (ms)':<8} | {'CANDIDATES'}")
+    print("-" * 75)
+    for name, queries in (("pantry", pantry), ("more like this", like_this)):
+        truth, latency = timed(exact.search_batch, queries, args.top_k)
+        print(f"{'exact, ' + name:<26} | {1.0:<9.3f} | {np.median(latency):<8.3f} | "
+              f"{np.percentile(latency, 99):<8.3f} | {len(exact)}")
+        for rerank in (True, False):
+            for nprobe in args.nprobe:
+                approx, latency = timed(ann.search_batch, queries, args.top_k, nprobe=nprobe, rerank=rerank)
+                list_sizes = np.sort(np.diff(ann.offsets))[::-1]
+                label = f"nprobe {nprobe}{', rerank' if rerank else ''}"
+                print(f"{label:<26} | {recall_at_k(truth, approx, queries, exact):<9.3f} | {np.median(latency):<8.3f} | "
+                      f"{np.percentile(latency, 99):<8.3f} | <= {list_sizes[:nprobe].sum()}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
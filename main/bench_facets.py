@@ -0,0 +1,72 @@
+import argparse
+import time
+from collections import Counter
+import numpy as np
+
+from bench_search import make_queries
+from facets import FacetIndex
+from features import featurize_chunk, fit_tfidf
+from ingest import iter_recipes
+from search import SearchIndex, l2_normalize, top_k
+
+
+def post_filter(index, query_matrix, allowed, k):
+    # The old way: score every recipe, then drop the ones failing the filter
+    scores = (l2_normalize(query_matrix) @ index.postings.T).tocsr()
+    results = []
+    for q in range(scores.shape[0]):
+        rows = scores.indices[scores.indptr[q]:scores.indptr[q + 1]].astype(np.int64)
+        values = scores.data[scores.indptr[q]:scores.indptr[q + 1]]
+        keep = allowed[rows] & (values > 0)
+        results.append(top_k(rows[keep], values[keep], k))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-filtering vs facet posting lists intersected before scoring")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print("Loading data")
+    recipes = list(iter_recipes(args.data, args.limit or None))
+    tokens, cluster_ids, _ = featurize_chunk(recipes)
+    vectorizer, tfidf_matrix = fit_tfidf(tokens)
+    index = SearchIndex(tfidf_matrix)
+
+    start = time.perf_counter()
+    facets = FacetIndex.build((recipe.tags for recipe in recipes), cluster_ids)
+    print(f"{len(facets)} recipes, {len(facets.tags)} tags, built in {time.perf_counter() - start:.2f}s")
+
+    # Filters from broad to narrow: the most common tag, two tags, two tags in one cluster
+    common = [tag for tag, _ in Counter(tag for recipe in recipes for tag in set(recipe.tags)).most_common(12)]
+    cluster = int(np.bincount(cluster_ids).argmax())
+    filters = [([common[0]], []), ([common[4], common[11]], []), ([common[4], common[11]], [cluster])]
+    query_matrix = vectorizer.transform(make_queries(recipes, args.queries))
+
+    print(f"\n{'FILTER':<44} | {'ROWS':<7} | {'POST (ms)':<9} | {'PRE (ms)':<9} | {'SAME'}")
+    print("-" * 84)
+    for tags, clusters in filters:
+        allowed_rows = facets.filter(tags, clusters)
+        allowed = np.zeros(len(index), dtype=bool)
+        allowed[allowed_rows] = True
+
+        start = time.perf_counter()
+        expected = post_filter(index, query_matrix, allowed, args.top_k)
+        post_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # The filter lookup is part of the filtered search's cost
+        results = index.search_batch(query_matrix, args.top_k, rows=facets.filter(tags, clusters))
+        pre_time = time.perf_counter() - start
+
+        same = all(np.array_equal(a[0], b[0]) and np.allclose(a[1], b[1]) for a, b in zip(expected, results))
+        label = " + ".join(tags + [f"cluster {c}" for c in clusters])
+        print(f"{label[:44]:<44} | {len(allowed_rows):<7} | {post_time / args.queries * 1000:<9.3f} | "
+              f"{pre_time / args.queries * 1000:<9.3f} | {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import time
+import numpy as np
+
+from ingest import iter_recipes
+from ontology import ONTOLOGY, assign_ontology
+
+
+def main():
+    parser = argparse.ArgumentParser(description="assign_ontology vs the compiled ontology table")
+    parser.add_argument("--data", default="../data/sample_recipes.csv",
+                        help="recipes CSV, the bundled synthetic sample by default")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    args = parser.parse_args()
+
+    print("Loading tags")
+    tag_lists = [recipe.tags for recipe in iter_recipes(args.data, args.limit or None)]
+    # A few hand-made edge cases on top of the real data
+    tag_lists += [[], ['Ground-Beef'], ['30-minutes-or-less', 'VEGAN'], ['non-vegetarian'], ['cookies-and-brownies']]
+
+    start = time.perf_counter()
+    expected = [assign_ontology(tags) for tags in tag_lists]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cluster_ids = ONTOLOGY.assign_ids(tag_lists)
+    compiled_time = time.perf_counter() - start
+
+    got = [(ONTOLOGY.palette[i]['name'], ONTOLOGY.palette[i]['color']) for i in cluster_ids]
+    per_recipe = [ONTOLOGY.assign(tags) for tags in tag_lists]
+    mismatches = [i for i, (a, b, c) in enumerate(zip(expected, got, per_recipe)) if not a == b == c]
+    if mismatches:
+        row = mismatches[0]
+        raise SystemExit(f"{len(mismatches)} mismatches, first: {tag_lists[row]} -> "
+                         f"{expected[row]} vs {got[row]} / {per_recipe[row]}")
+
+    print(f"{len(tag_lists)} recipes, {len(ONTOLOGY._tag_ids)} distinct tags, all assignments identical")
+    print(f"  assign_ontology:   {legacy_time:.3f}s")
+    print(f"  compiled table:    {compiled_time:.3f}s ({legacy_time / max(compiled_time, 1e-9):.1f}x)")
+    counts = np.bincount(cluster_ids, minlength=len(ONTOLOGY.palette))
+    for label, count in zip(ONTOLOGY.palette, counts):
+        print(f"  {label['name']:<22} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import random
+import time
+
+from ingest import iter_recipes
+from pantry import PantryIndex, ingredient_key, MIN_DF
+
+
+def make_pantries(recipes, count, seed=42):
+    """
+    A pantry is a handful of ingredients pulled from a few random recipes.
+    """
+    rng = random.Random(seed)
+    pantries = [["salt", "butter", "eggs", "flour", "sugar", "milk"]]
+    while len(pantries) < count:
+        pantry = set()
+        for _ in range(rng.randint(1, 4)):
+            ingredients = rng.choice(recipes).ingredients
+            if ingredients:
+                pantry.update(rng.sample(ingredients, min(len(ingredients), rng.randint(1, 5))))
+        pantries.append(sorted(pantry))
+    return pantries
+
+
+def set_search(key_sets, known, pantry, top_k):
+    # Reference: a Python set intersection per recipe
+    pantry_keys = {ingredient_key(item) for item in pantry} & known
+    ranked = []
+    for row, keys in enumerate(key_sets):
+        have = len(keys & pantry_keys)
+        if have:
+            ranked.append((len(keys) - have, -have, row))
+    ranked.sort()
+    return [row for _, _, row in ranked[:top_k]], ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set intersection vs packed-bitset pantry coverage")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print("Loading data")
+    recipes = list(iter_recipes(args.data, args.limit or None))
+
+    start = time.perf_counter()
+    pantry_index = PantryIndex.build(recipe.ingredients for recipe in recipes)
+    build_time = time.perf_counter() - start
+    print(f"{len(pantry_index)} recipes, {len(pantry_index.vocabulary)} ingredients with df >= {MIN_DF} "
+          f"in {pantry_index.bits.shape[0]} words ({pantry_index.bits.nbytes / 1e6:.1f} MB), built in {build_time:.2f}s")
+
+    key_sets = [{ingredient_key(item) for item in recipe.ingredients if item.strip()} for recipe in recipes]
+    known = set(pantry_index.vocabulary)
+    pantries = make_pantries(recipes, args.queries)
+
+    start = time.perf_counter()
+    expected = [set_search(key_sets, known, pantry, args.top_k) for pantry in pantries]
+    set_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [pantry_index.search(pantry, args.top_k) for pantry in pantries]
+    bitset_time = time.perf_counter() - start
+
+    mismatches = 0
+    for (expected_rows, ranked), (rows, have, missing, _) in zip(expected, results):
+        by_row = {row: (-minus_have, miss) for miss, minus_have, row in ranked}
+        if rows.tolist() != expected_rows or any(by_row[r] != (h, m) for r, h, m in zip(rows, have, missing)):
+            mismatches += 1
+
+    n = len(pantries)
+    print(f"\n{'ENGINE':<24} | {'TOTAL (s)':<10} | {'PER QUERY (ms)'}")
+    print("-" * 56)
+    print(f"{'set intersection':<24} | {set_time:<10.3f} | {set_time / n * 1000:.3f}")
+    print(f"{'bitset + popcount':<24} | {bitset_time:<10.3f} | {bitset_time / n * 1000:.3f}")
+    print(f"\nSpeedup: {set_time / max(bitset_time, 1e-9):.1f}x, ranking mismatches: {mismatches}/{n}")
+    rows, have, missing, _ = results[0]
+    print(f"Pantry {pantries[0]}: best recipes miss {missing.tolist()} ingredients")
+
+
+if __name__ == "__main__":
+    main()
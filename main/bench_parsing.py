@@ -0,0 +1,47 @@
+import argparse
+import ast
+import csv
+import time
+
+from parsing import parse_list, _parse_string_list
+
+LIST_COLUMNS = ['ingredients', 'tags', 'steps']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ast.literal_eval vs parse_list on the recipe CSV")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    args = parser.parse_args()
+
+    print("Reading raw list columns")
+    columns = {name: [] for name in LIST_COLUMNS}
+    with open(args.data, mode="r", encoding="utf-8", newline="") as file:
+        for i, row in enumerate(csv.DictReader(file)):
+            if args.limit and i >= args.limit: break
+            for name in LIST_COLUMNS:
+                columns[name].append(row[name])
+
+    print(f"{'COLUMN':<12} | {'ROWS':<8} | {'AST (s)':<8} | {'FAST (s)':<8} | {'SPEEDUP':<7} | FALLBACKS")
+    print("-" * 70)
+    for name in LIST_COLUMNS:
+        values = columns[name]
+
+        start = time.perf_counter()
+        expected = [ast.literal_eval(v) for v in values]
+        ast_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = [parse_list(v) for v in values]
+        fast_time = time.perf_counter() - start
+
+        if got != expected:
+            raise SystemExit(f"parse_list disagrees with ast.literal_eval on column '{name}'")
+        fallbacks = sum(1 for v in values if _parse_string_list(v) is None)
+
+        print(f"{name:<12} | {len(values):<8} | {ast_time:<8.3f} | {fast_time:<8.3f} | "
+              f"{ast_time / max(fast_time, 1e-9):<6.1f}x | {fallbacks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import numpy as np
+
+from ann import AnnIndex
+from features import featurize_chunk, fit_tfidf, pantry_query
+from ingest import iter_recipes
+from search import SearchIndex, brute_force_search
+
+# Retrieval quality and speed in one table, so a change that makes search
+# faster but worse (or better but slower) shows up on both axes. Every
+# query comes from a known recipe with some of its ingredients dropped;
+# the engine is scored on how high it ranks that source recipe.
+#
+#   python bench_retrieval.py                                   bundled synthetic sample, offline
+#   python bench_retrieval.py --save before.json
+#   python bench_retrieval.py --baseline before.json            flags regressions, exit code 1
+
+# What counts as a regression against --baseline. Latency also gets a
+# small absolute slack, sub-millisecond timings jitter more than 25%.
+MAX_QUALITY_DROP = 0.005
+MAX_LATENCY_GROWTH = 1.25
+LATENCY_SLACK_MS = 0.1
+
+
+def make_holdout_queries(recipes, count, drop, seed=42):
+    """
+    (source row, ingredients) pairs: a random recipe with a share `drop`
+    of its ingredients removed, at least two kept. Same seed, same set.
+    """
+    rng = random.Random(seed)
+    candidates = [row for row, recipe in enumerate(recipes) if len(recipe.ingredients) >= 3]
+    queries = []
+    for row in rng.sample(candidates, min(count, len(candidates))):
+        ingredients = recipes[row].ingredients
+        keep = max(2, round(len(ingredients) * (1 - drop)))
+        queries.append((row, rng.sample(ingredients, keep)))
+    return queries
+
+
+def measure(build):
+    """
+    Runs build() under tracemalloc: (result, seconds, peak MB allocated).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def sparse_mb(matrix):
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6
+
+
+def run_engine(search, query_matrix, sources, k, repeats):
+    """
+    One query at a time, like a server without batching. Returns recall@k,
+    MRR@k and the per-query latencies in ms, each the best of `repeats`
+    runs so a scheduler hiccup doesn't count as a slow query.
+    """
+    hits, reciprocal, latencies = 0, 0.0, []
+    for q, source in enumerate(sources):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows, _ = search(query_matrix[q], k)
+            best = min(best, time.perf_counter() - start)
+        latencies.append(best * 1000)
+        found = np.flatnonzero(np.asarray(rows) == source)
+        if len(found):
+            hits += 1
+            reciprocal += 1.0 / (found[0] + 1)
+    return hits / len(sources), reciprocal / len(sources), np.asarray(latencies)
+
+
+def compare(report, baseline):
+    """
+    Prints every metric that got worse than the baseline run, returns how many.
+    """
+    regressions = 0
+    for name, now in report['engines'].items():
+        before = baseline['engines'].get(name)
+        if before is None:
+            continue
+        for metric in ("recall", "mrr"):
+            if now[metric] < before[metric] - MAX_QUALITY_DROP:
+                print(f"  REGRESSION {name}: {metric} {before[metric]:.3f} -> {now[metric]:.3f}")
+                regressions += 1
+        for metric in ("p50_ms", "p99_ms"):
+            if now[metric] > before[metric] * MAX_LATENCY_GROWTH + LATENCY_SLACK_MS:
+                print(f"  REGRESSION {name}: {metric} {before[metric]:.3f} -> {now[metric]:.3f}")
+                regressions += 1
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, MRR, latency and memory of every search engine")
+    parser.add_argument("--data", default="../data/sample_recipes.csv",
+                        help="any RAW_recipes.csv, the default is the bundled synthetic sample")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--drop", type=float, default=0.3, help="share of each recipe's ingredients left out of its query")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[2, 8])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per query, the fastest counts")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="earlier --save report to check for regressions")
+    args = parser.parse_args()
+
+    print("Loading data")
+    recipes = list(iter_recipes(args.data, args.limit or None))
+    tokens, _, _ = featurize_chunk(recipes)
+    vectorizer, tfidf_matrix = fit_tfidf(tokens)
+    del tokens
+
+    queries = make_holdout_queries(recipes, args.queries, args.drop, args.seed)
+    sources = [row for row, _ in queries]
+    query_matrix = vectorizer.transform([pantry_query(ingredients) for _, ingredients in queries]).tocsr()
+    print(f"{len(recipes)} recipes, {len(queries)} held-out queries dropping {args.drop:.0%} of the ingredients")
+
+    index, index_time, index_mb = measure(lambda: SearchIndex(tfidf_matrix))
+    ann, ann_time, ann_mb = measure(lambda: AnnIndex.fit(tfidf_matrix, exact=index))
+    # Memory held while serving: brute force only needs the TF-IDF matrix,
+    # the reranking ANN keeps the inverted index on top of its own arrays
+    ann_size = sum(array.nbytes for array in (ann.components, ann.centroids, ann.vectors, ann.order, ann.offsets)) / 1e6
+    index_size = sparse_mb(index.matrix) + sparse_mb(index.postings)
+    engines = [("brute force", lambda q, k: brute_force_search(q, tfidf_matrix, k), sparse_mb(tfidf_matrix), 0.0, 0.0),
+               ("inverted index", index.search, index_size, index_time, index_mb)]
+    for nprobe in args.nprobe:
+        for rerank in (True, False):
+            search = lambda q, k, nprobe=nprobe, rerank=rerank: ann.search_batch(q, k, nprobe=nprobe, rerank=rerank)[0]
+            engines.append((f"ann nprobe {nprobe}{', rerank' if rerank else ''}", search,
+                            ann_size + (index_size if rerank else 0.0), ann_time, ann_mb))
+
+    report = {'data': args.data, 'rows': len(recipes), 'queries': len(queries), 'drop': args.drop,
+              'top_k': args.top_k, 'engines': {}}
+    k = args.top_k
+    print(f"\n{'ENGINE':<24} | {'RECALL@' + str(k):<9} | {'MRR@' + str(k):<7} | {'p50 (ms)':<8} | "
+          f"{'p99 (ms)':<8} | {'INDEX MB':<8} | {'BUILD (s)':<9} | {'BUILD PEAK MB'}")
+    print("-" * 108)
+    for name, search, size_mb, build_time, build_mb in engines:
+        recall, mrr, latency = run_engine(search, query_matrix, sources, k, args.repeats)
+        p50, p99 = float(np.median(latency)), float(np.percentile(latency, 99))
+        report['engines'][name] = {'recall': recall, 'mrr': mrr, 'p50_ms': p50, 'p99_ms': p99,
+                                   'index_mb': size_mb, 'build_s': build_time, 'build_mb': build_mb}
+        print(f"{name:<24} | {recall:<9.3f} | {mrr:<7.3f} | {p50:<8.3f} | {p99:<8.3f} | {size_mb:<8.2f} | "
+              f"{build_time:<9.2f} | {build_mb:.1f}")
+    print("\nINDEX MB is what the engine keeps in memory to answer queries, "
+          "BUILD PEAK MB the tracemalloc peak while building it.")
+
+    if args.save:
+        with open(args.save, mode="w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, mode="r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        print(f"\nAgainst {args.baseline}:")
+        regressions = compare(report, baseline)
+        if regressions:
+            sys.exit(1)
+        print("  no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import random
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from features import featurize_chunk, fit_tfidf
+from ingest import iter_recipes
+from search import SearchIndex, brute_force_search
+
+LEGACY_QUERIES = [
+    "chicken garlic soy sauce ginger",
+    "flour sugar eggs butter chocolate",
+    "ground beef kidney beans chili powder",
+]
+
+
+def make_queries(recipes, count, seed=42):
+    """
+    Pantry-style queries: a few raw ingredients from random recipes.
+    """
+    rng = random.Random(seed)
+    queries = list(LEGACY_QUERIES)
+    while len(queries) < count:
+        ingredients = rng.choice(recipes).ingredients
+        if ingredients:
+            queries.append(" ".join(rng.sample(ingredients, min(len(ingredients), rng.randint(2, 5)))))
+    return queries
+
+
+def legacy_search(user_vector, feature_matrix, top_k):
+    # Exactly what search_galaxy in test3.py does
+    similarity_scores = cosine_similarity(user_vector, feature_matrix).flatten()
+    return similarity_scores.argsort()[-top_k:][::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brute-force cosine vs inverted index search")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print("Loading data")
+    recipes = list(iter_recipes(args.data, args.limit or None))
+    tokens, _, _ = featurize_chunk(recipes)
+
+    print("Vectorizing")
+    vectorizer, tfidf_matrix = fit_tfidf(tokens)
+    del tokens
+
+    start = time.perf_counter()
+    index = SearchIndex(tfidf_matrix)
+    print(f"Index built over {len(index)} recipes in {time.perf_counter() - start:.3f}s")
+
+    queries = make_queries(recipes, args.queries)
+    query_vectors = [vectorizer.transform([q]) for q in queries]
+
+    start = time.perf_counter()
+    for vector in query_vectors:
+        legacy_search(vector, tfidf_matrix, args.top_k)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [index.search(vector, args.top_k) for vector in query_vectors]
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = index.search_batch(vectorizer.transform(queries), args.top_k)
+    batch_time = time.perf_counter() - start
+
+    mismatches = 0
+    for (rows, scores), (batch_rows, batch_scores) in zip(results, batch_results):
+        if not np.array_equal(rows, batch_rows) or not np.allclose(scores, batch_scores):
+            mismatches += 1
+    for vector, (rows, scores) in zip(query_vectors, results):
+        expected_rows, expected_scores = brute_force_search(vector, tfidf_matrix, args.top_k)
+        if not np.array_equal(rows, expected_rows) or not np.allclose(scores, expected_scores):
+            mismatches += 1
+
+    n = len(query_vectors)
+    print(f"\n{'ENGINE':<28} | {'TOTAL (s)':<10} | {'PER QUERY (ms)'}")
+    print("-" * 60)
+    print(f"{'cosine_similarity + argsort':<28} | {legacy_time:<10.3f} | {legacy_time / n * 1000:.3f}")
+    print(f"{'inverted index + partition':<28} | {index_time:<10.3f} | {index_time / n * 1000:.3f}")
+    print(f"{'batched sparse x sparse':<28} | {batch_time:<10.3f} | {batch_time / n * 1000:.3f}")
+    print(f"\nSpeedup: {legacy_time / max(index_time, 1e-9):.1f}x, "
+          f"ranking mismatches vs brute force / batch: {mismatches}/{n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Cold start of a search process: how long each entry point takes to
+# import, and how long a fresh interpreter takes to answer its first query.
+# Every run is a new subprocess (best of --repeats), so nothing is already
+# sitting in sys.modules.
+#   python bench_startup.py --index-dir galaxy_index
+
+HEAVY = ["umap", "numba", "pynndescent", "sklearn"]
+
+IMPORT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+FIRST_QUERY = """
+import sys, json
+{imports}
+from search import SearchIndex, search_queries
+galaxy = {load}({index_dir!r})
+index = SearchIndex(galaxy['tfidf_matrix'], ids=galaxy['ids'],
+                    clusters=galaxy['cluster_ids'], cluster_names=galaxy['cluster_names'])
+result = search_queries(index, galaxy['vectorizer'], [{query!r}], {k})[0]
+print(json.dumps({{'rows': result['rows'], 'heavy': [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+# What a search process loads: the fast path, the build side's loader with
+# the sklearn vectorizer, and that loader after `import umap` the way the
+# build script used to import it at the top
+PATHS = [
+    ("query.load_index", "import query", "query.load_index"),
+    ("artifacts.load_index", "import artifacts", "artifacts.load_index"),
+    ("umap + artifacts", "import umap, artifacts", "artifacts.load_index"),
+]
+
+
+def run(code, repeats):
+    """
+    Best wall time of `repeats` fresh interpreters running code, with the
+    JSON line the last one printed.
+    """
+    best, output = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if done.returncode:
+            raise SystemExit(done.stderr)
+        best = min(best, elapsed)
+        output = json.loads(done.stdout.strip().splitlines()[-1])
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first query of a fresh search process")
+    parser.add_argument("--index-dir", default="galaxy_index", help="saved index from test5.py")
+    parser.add_argument("--query", default="chicken garlic onion")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'IMPORT':<22} | {'IMPORT (s)':<10} | {'PROCESS (s)':<11} | HEAVY MODULES LOADED")
+    print("-" * 80)
+    for module in ("query", "server", "artifacts", "test5"):
+        wall, output = run(IMPORT.format(module=module, heavy=HEAVY), args.repeats)
+        print(f"{module:<22} | {output['seconds']:<10.2f} | {wall:<11.2f} | {', '.join(output['heavy']) or '-'}")
+
+    print(f"\n{'FIRST QUERY':<22} | {'PROCESS (s)':<11} | {'SAME ROWS':<9} | HEAVY MODULES LOADED")
+    print("-" * 80)
+    reference = None
+    for name, imports, load in PATHS:
+        code = FIRST_QUERY.format(imports=imports, load=load, index_dir=args.index_dir,
+                                  query=args.query, k=args.k, heavy=HEAVY)
+        wall, output = run(code, args.repeats)
+        if reference is None:
+            reference = output['rows']
+        same = "yes" if output['rows'] == reference else "NO"
+        print(f"{name:<22} | {wall:<11.2f} | {same:<9} | {', '.join(output['heavy']) or '-'}")
+    print("\nPROCESS is the whole fresh interpreter, from spawn to exit, first query included.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from bench_search import make_queries
+from features import TFIDF_PARAMS, featurize_chunk, fit_tfidf
+from hashing import HashingTfidf, N_FEATURES
+from ingest import iter_chunks, iter_recipes
+from normalize import pretokenized
+from search import SearchIndex
+
+
+def fit_in_memory(path, limit, chunk_size):
+    # What test5.py does by default: every token list in memory, one fit
+    master_features = []
+    for chunk in iter_chunks(path, chunk_size, limit):
+        master_features.extend(featurize_chunk(chunk)[0])
+    return fit_tfidf(master_features)
+
+
+def fit_hashing(path, limit, chunk_size, out_dir, n_features):
+    vectorizer = HashingTfidf(n_features=n_features, **TFIDF_PARAMS)
+    for chunk in iter_chunks(path, chunk_size, limit):
+        vectorizer.partial_fit(featurize_chunk(chunk)[0])
+    return vectorizer, vectorizer.finish(out_dir)
+
+
+def measure(fit, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    vectorizer, matrix = fit(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return vectorizer, matrix, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TfidfVectorizer vs streamed hashing TF-IDF")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = whole file")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--n-features", type=int, default=N_FEATURES, help="hashed columns before the df filter")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    limit = args.limit or None
+
+    print("Fitting TfidfVectorizer")
+    tfidf, tfidf_matrix, tfidf_time, tfidf_peak = measure(fit_in_memory, args.data, limit, args.chunk_size)
+
+    print("Fitting hashing TF-IDF")
+    with tempfile.TemporaryDirectory() as out_dir:
+        hashing, hashing_matrix, hashing_time, hashing_peak = measure(
+            fit_hashing, args.data, limit, args.chunk_size, out_dir, args.n_features)
+
+        # Terms that share a hashed column with another kept term
+        terms = tfidf.get_feature_names_out()
+        hasher = HashingVectorizer(n_features=args.n_features, analyzer=pretokenized, alternate_sign=False, norm=None)
+        columns = hasher.transform([[term] for term in terms]).indices
+        collisions = len(terms) - len(np.unique(columns))
+
+        print("Comparing search results")
+        recipes = list(iter_recipes(args.data, min(limit or 20000, 20000)))
+        queries = make_queries(recipes, args.queries)
+        tfidf_results = SearchIndex(tfidf_matrix).search_batch(tfidf.transform(queries), args.top_k)
+        hashing_results = SearchIndex(hashing_matrix).search_batch(hashing.transform(queries), args.top_k)
+
+        overlap, identical, score_error = [], 0, []
+        for (rows, scores), (hashed_rows, hashed_scores) in zip(tfidf_results, hashing_results):
+            # Queries with no known ingredient return nothing from either engine
+            overlap.append(len(np.intersect1d(rows, hashed_rows)) / len(rows) if len(rows) else float(not len(hashed_rows)))
+            identical += np.array_equal(rows, hashed_rows)
+            if len(scores) == len(hashed_scores):
+                score_error.append(np.abs(np.asarray(scores) - np.asarray(hashed_scores)).max(initial=0))
+
+        matrix_mb = sum(a.nbytes for a in (hashing_matrix.data, hashing_matrix.indices, hashing_matrix.indptr)) / 1e6
+        del hashing_matrix
+
+    n = len(queries)
+    print(f"\n{tfidf_matrix.shape[0]} recipes, {len(terms)} terms kept by TfidfVectorizer, "
+          f"{len(hashing.idf_)} hashed columns kept, {collisions} colliding terms")
+    print(f"\n{'ENGINE':<20} | {'FIT (s)':<8} | {'PEAK PY MEM (MB)':<17} | {'MATRIX'}")
+    print("-" * 70)
+    print(f"{'TfidfVectorizer':<20} | {tfidf_time:<8.2f} | {tfidf_peak / 1e6:<17.1f} | in memory")
+    print(f"{'hashing, streamed':<20} | {hashing_time:<8.2f} | {hashing_peak / 1e6:<17.1f} | "
+          f"{matrix_mb:.1f} MB memory-mapped")
+    print(f"\nTop-{args.top_k} overlap {np.mean(overlap):.4f}, identical rankings {identical}/{n}, "
+          f"max score difference {max(score_error, default=0):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from hashing import HashingTfidf, is_hashed, read_csr, write_csr
+
+# Bump whenever feature building changes so old TF-IDF entries stop matching
+FEATURE_VERSION = 1
+
+_digest_memo = {}
+
+
+def file_digest(path):
+    """
+    sha256 of the input file, memoized per (path, size, mtime) for this process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digest_memo:
+        digest = hashlib.sha256()
+        with open(path, mode="rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _digest_memo[memo_key] = digest.hexdigest()
+    return _digest_memo[memo_key]
+
+
+def stage_key(*parts):
+    """
+    Content address for a stage: hash of everything that affects its output.
+    """
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+def _entry(cache_dir, stage, key):
+    return os.path.join(cache_dir, stage, key)
+
+
+def _open_entry(cache_dir, stage, key):
+    path = _entry(cache_dir, stage, key)
+    if not os.path.isdir(path):
+        return None
+    # Touch it so eviction treats it as recently used
+    os.utime(path)
+    return path
+
+
+def _commit_entry(cache_dir, stage, key, write):
+    """
+    Writes into a temp dir and renames it into place so a crash mid-write
+    never leaves a half-written entry behind.
+    """
+    final = _entry(cache_dir, stage, key)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    write(tmp)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+
+def restore_vectorizer(terms, idf, params):
+    """
+    Rebuilds a fitted TfidfVectorizer from its vocabulary and IDF weights.
+    """
+    if 'dtype' in params:
+        # JSON manifests name the dtype, sklearn wants the numpy type
+        params = dict(params, dtype=np.dtype(params['dtype']).type)
+    vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(terms)}, **params)
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def read_tfidf(path, params):
+    """
+    Reads vocabulary.json / idf.npy / tfidf.npz from a directory, or the
+    hashing engine's files with the matrix memory-mapped.
+    """
+    if is_hashed(path):
+        vectorizer = HashingTfidf.load(path)
+        return vectorizer, read_csr(path, len(vectorizer.idf_))
+    with open(os.path.join(path, "vocabulary.json"), mode="r", encoding="utf-8") as file:
+        terms = json.load(file)
+    idf = np.load(os.path.join(path, "idf.npy"))
+    matrix = sp.load_npz(os.path.join(path, "tfidf.npz")).tocsr()
+    return restore_vectorizer(terms, idf, params), matrix
+
+
+def write_tfidf(path, vectorizer, matrix):
+    if isinstance(vectorizer, HashingTfidf):
+        vectorizer.save(path)
+        write_csr(path, matrix)
+        return
+    # An index dir rebuilt with the other engine must not look hashed
+    if is_hashed(path):
+        os.remove(os.path.join(path, "hashing.json"))
+    with open(os.path.join(path, "vocabulary.json"), mode="w", encoding="utf-8") as file:
+        json.dump(vectorizer.get_feature_names_out().tolist(), file)
+    np.save(os.path.join(path, "idf.npy"), vectorizer.idf_)
+    sp.save_npz(os.path.join(path, "tfidf.npz"), matrix)
+
+
+def load_tfidf(cache_dir, key, params):
+    path = _open_entry(cache_dir, "tfidf", key)
+    if path is None:
+        return None
+    return read_tfidf(path, params)
+
+
+def save_tfidf(cache_dir, key, vectorizer, matrix):
+    _commit_entry(cache_dir, "tfidf", key, lambda path: write_tfidf(path, vectorizer, matrix))
+
+
+def load_embedding(cache_dir, key):
+    path = _open_entry(cache_dir, "umap", key)
+    if path is None:
+        return None
+    return np.load(os.path.join(path, "embedding.npy"))
+
+
+def _sparse_distance_fix():
+    """
+    pynndescent restores a pickled index with the dense version of its metric
+    even when it was built on sparse input, and the numba search then fails
+    to compile. Point sparse indexes back at the sparse distance.
+    """
+    from pynndescent import pynndescent_, sparse
+
+    restore = pynndescent_.NNDescent._set_distance_func
+    if getattr(restore, "sparse_fix", False):
+        return
+
+    def set_distance_func(self):
+        restore(self)
+        if getattr(self, "_is_sparse", False) and self.metric in sparse.sparse_named_distances:
+            if self.metric in sparse.sparse_fast_distance_alternatives:
+                self._distance_func = sparse.sparse_fast_distance_alternatives[self.metric]["dist"]
+            else:
+                self._distance_func = sparse.sparse_named_distances[self.metric]
+
+    set_distance_func.sparse_fix = True
+    pynndescent_.NNDescent._set_distance_func = set_distance_func
+
+
+def read_reducer(path):
+    """
+    Unpickling a reducer rebuilds its numba search functions, which is slow,
+    so it is only loaded when something actually needs reducer.transform.
+    """
+    _sparse_distance_fix()
+    with open(path, mode="rb") as file:
+        return pickle.load(file)
+
+
+def write_reducer(path, reducer):
+    with open(path, mode="wb") as file:
+        pickle.dump(reducer, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def reducer_path(cache_dir, key):
+    path = _open_entry(cache_dir, "umap", key)
+    if path is None:
+        return None
+    return os.path.join(path, "reducer.pkl")
+
+
+def load_reducer(cache_dir, key):
+    path = reducer_path(cache_dir, key)
+    if path is None:
+        return None
+    return read_reducer(path)
+
+
+def save_umap(cache_dir, key, reducer, embedding):
+    def write(path):
+        np.save(os.path.join(path, "embedding.npy"), embedding)
+        write_reducer(os.path.join(path, "reducer.pkl"), reducer)
+    _commit_entry(cache_dir, "umap", key, write)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def evict(cache_dir, max_bytes):
+    """
+    Deletes least recently used entries until the cache fits in max_bytes.
+    The most recently used entry is always kept.
+    """
+    entries = []
+    for stage in ("tfidf", "umap"):
+        stage_dir = os.path.join(cache_dir, stage)
+        if not os.path.isdir(stage_dir):
+            continue
+        for key in os.listdir(stage_dir):
+            path = os.path.join(stage_dir, key)
+            if ".tmp-" in key:
+                # Leftover from a crashed run
+                if time.time() - os.path.getmtime(path) > 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(path), _dir_size(path), path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries[:-1]:
+        if total <= max_bytes:
+            break
+        print(f"  cache: evicting {os.path.relpath(path, cache_dir)} ({size / 1e6:.1f} MB)")
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
@@ -0,0 +1,92 @@
+import sys
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from cache import restore_vectorizer
+from hashing import df_filter
+
+# test5.py --compact: the corpus is held as flat int32/float32 arrays from
+# the first chunk on, instead of a Python list of tokens per recipe and a
+# float64 TF-IDF matrix. The fitted vectorizer is the same TfidfVectorizer
+# the default path saves, only with dtype float32.
+
+
+class TokenCodes:
+    """
+    Every recipe's token list as int32 codes into a vocabulary that grows
+    chunk by chunk, plus one length per recipe. Takes the place of the
+    master_features list; fit_tfidf() returns what
+    TfidfVectorizer(analyzer=pretokenized, dtype=float32).fit_transform
+    would return for the same lists.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.codes = []
+        self.lengths = []
+
+    def add(self, token_lists):
+        vocabulary = self.vocabulary
+        codes = [vocabulary.setdefault(token, len(vocabulary)) for tokens in token_lists for token in tokens]
+        self.codes.append(np.asarray(codes, dtype=np.int32))
+        self.lengths.append(np.fromiter(map(len, token_lists), dtype=np.int32, count=len(token_lists)))
+
+    def _flatten(self):
+        # One array each from here on, the chunk list is dropped
+        if len(self.codes) != 1:
+            self.codes = [np.concatenate(self.codes) if self.codes else np.empty(0, dtype=np.int32)]
+            self.lengths = [np.concatenate(self.lengths) if self.lengths else np.empty(0, dtype=np.int32)]
+        return self.codes[0], self.lengths[0]
+
+    @property
+    def nbytes(self):
+        codes, lengths = self._flatten()
+        strings = sum(sys.getsizeof(token) for token in self.vocabulary)
+        return codes.nbytes + lengths.nbytes + sys.getsizeof(self.vocabulary) + strings
+
+    def oov_rate(self, vectorizer):
+        """
+        Share of tokens the fitted vocabulary does not know, test5.oov_rate
+        without the token lists.
+        """
+        codes, _ = self._flatten()
+        vocabulary = set(vectorizer.get_feature_names_out())
+        known = np.fromiter((token in vocabulary for token in self.vocabulary), dtype=bool, count=len(self.vocabulary))
+        term_counts = np.bincount(codes, minlength=len(self.vocabulary))
+        total = term_counts.sum()
+        return float(1 - term_counts[known].sum() / total) if total else 0.0
+
+    def fit_tfidf(self, params, dtype=np.float32):
+        """
+        Returns (vectorizer, CSR matrix) with TfidfVectorizer's defaults:
+        terms in sorted order, max_df/min_df, smooth idf, l2-normalized rows.
+        """
+        codes, lengths = self._flatten()
+        n_docs, n_terms = len(lengths), len(self.vocabulary)
+        indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        counts = sp.csr_matrix((np.ones(len(codes), dtype=dtype), codes, indptr), shape=(n_docs, n_terms))
+        counts.sum_duplicates()
+
+        df = np.bincount(counts.indices, minlength=n_terms)
+        keep = df_filter(df, n_docs, params.get('max_df', 1.0), params.get('min_df', 1))
+
+        terms = list(self.vocabulary)
+        columns = [code for code in sorted(range(n_terms), key=terms.__getitem__) if keep[code]]
+        column_of = np.full(n_terms, -1, dtype=np.int32)
+        column_of[columns] = np.arange(len(columns), dtype=np.int32)
+
+        mapped = column_of[counts.indices]
+        kept = mapped >= 0
+        kept_before = np.concatenate([[0], np.cumsum(kept)])
+        index_dtype = np.int32 if kept.sum() < 2 ** 31 else np.int64
+        matrix = sp.csr_matrix((counts.data[kept], mapped[kept].astype(index_dtype),
+                                kept_before[counts.indptr].astype(index_dtype)), shape=(n_docs, len(columns)))
+        matrix.sort_indices()
+
+        # Same arithmetic and dtype as TfidfTransformer with smooth_idf
+        idf = np.log((n_docs + 1) / (df[columns].astype(dtype) + 1)).astype(dtype) + 1
+        matrix.data *= idf[matrix.indices]
+        matrix = normalize(matrix, copy=False)
+        vectorizer = restore_vectorizer([terms[code] for code in columns], idf, dict(params, dtype=np.dtype(dtype).name))
+        return vectorizer, matrix
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import numpy as np
+
+from octree import write_tiles
+
+# Layout of the galaxy/ folder index2.html reads:
+#   galaxy.json          manifest: counts, shard size, cluster palette, bounds
+#   points.bin           float32 x/y/z for every row, then one uint8 cluster id per row
+#   names.json           recipe ids and display names, row aligned
+#   details/<n>.json     ingredients/steps for rows n*shard_size .. (n+1)*shard_size-1
+#   neighbors/<n>.bin    similar recipes for the same rows: int32 rows, then float16 scores,
+#                        k of each per row (see neighbors.py)
+#   tiles/               octree level-of-detail tiles the viewer streams (see octree.py)
+
+DETAIL_SHARD_SIZE = 256
+
+
+def spool_line(recipe):
+    """
+    One JSON line per recipe with the already decoded ingredients/steps/tags,
+    so the export never has to parse the CSV list columns again.
+    """
+    return json.dumps([recipe.id, recipe.name, recipe.ingredients, recipe.steps, recipe.tags]) + "\n"
+
+
+def iter_details(spool):
+    """
+    Replays the spool as display-ready detail records, in row order.
+    """
+    spool.seek(0)
+    for line in spool:
+        recipe_id, name, ingredients, steps, _ = json.loads(line)
+        yield {
+            'id': recipe_id,
+            'name': name.title(),
+            # Capitalize the first letter of each ingredient and step
+            'ingredients': [ing.capitalize() for ing in ingredients],
+            'steps': [step.capitalize() for step in steps]
+        }
+
+
+def iter_ingredients(spool):
+    """
+    Replays just the raw ingredient lists of the spool, in row order.
+    """
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)[2]
+
+
+def iter_tags(spool):
+    """
+    Replays the tag lists of the spool, in row order.
+    """
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)[4]
+
+
+def write_points(path, embedding_3d, cluster_ids):
+    """
+    Little-endian float32 positions followed by the uint8 cluster ids, so
+    the page can wrap the buffer in a Float32Array without any parsing.
+    """
+    with open(path, mode="wb") as file:
+        file.write(np.ascontiguousarray(embedding_3d, dtype='<f4').tobytes())
+        file.write(np.ascontiguousarray(cluster_ids, dtype=np.uint8).tobytes())
+
+
+def write_neighbors(neighbor_dir, rows, scores, shard_size=DETAIL_SHARD_SIZE):
+    """
+    One small binary per detail shard, so a click costs a single fetch.
+    Every shard is rewritten, an append can change the old rows' lists too.
+    """
+    shutil.rmtree(neighbor_dir, ignore_errors=True)
+    os.makedirs(neighbor_dir)
+    for shard, start in enumerate(range(0, len(rows), shard_size)):
+        with open(os.path.join(neighbor_dir, f"{shard}.bin"), mode="wb") as file:
+            file.write(np.ascontiguousarray(rows[start:start + shard_size], dtype='<i4').tobytes())
+            file.write(np.ascontiguousarray(scores[start:start + shard_size], dtype='<f2').tobytes())
+
+
+def export_galaxy(out_dir, spool, embedding_3d, cluster_ids, palette, shard_size=DETAIL_SHARD_SIZE, start_row=0,
+                  neighbors=None):
+    """
+    cluster_ids index palette, a list of {'name', 'color'} (see ontology.py).
+    With start_row > 0 the spool only holds the rows from start_row on and
+    the details/names already exported for the earlier rows are kept.
+    neighbors is the (rows, scores) table of neighbors.py for every row.
+    """
+    detail_dir = os.path.join(out_dir, "details")
+    ids, names, shard = [], [], []
+    if start_row:
+        names_json = _read_json(os.path.join(out_dir, "names.json"))
+        ids, names = names_json['ids'][:start_row], names_json['names'][:start_row]
+        # Refill the last, partly filled shard
+        if start_row % shard_size:
+            shard = _read_json(os.path.join(detail_dir, f"{start_row // shard_size}.json"))[:start_row % shard_size]
+    else:
+        shutil.rmtree(detail_dir, ignore_errors=True)
+        os.makedirs(detail_dir)
+
+    write_points(os.path.join(out_dir, "points.bin"), embedding_3d, cluster_ids)
+    write_tiles(out_dir, embedding_3d, cluster_ids)
+
+    neighbor_dir = os.path.join(out_dir, "neighbors")
+    if neighbors is not None:
+        write_neighbors(neighbor_dir, *neighbors, shard_size=shard_size)
+    else:
+        shutil.rmtree(neighbor_dir, ignore_errors=True)
+
+    for row, details in enumerate(iter_details(spool), start_row):
+        # The panel badge of a similar recipe, which the viewer has no tile for
+        details['cluster'] = int(cluster_ids[row])
+        ids.append(details['id'])
+        names.append(details['name'])
+        shard.append(details)
+        if len(shard) == shard_size:
+            _write_json(os.path.join(detail_dir, f"{row // shard_size}.json"), shard)
+            shard = []
+    if shard:
+        _write_json(os.path.join(detail_dir, f"{len(ids) // shard_size}.json"), shard)
+
+    _write_json(os.path.join(out_dir, "names.json"), {'ids': ids, 'names': names})
+    _write_json(os.path.join(out_dir, "galaxy.json"), {
+        'count': len(ids),
+        'shard_size': shard_size,
+        'clusters': palette,
+        'neighbors': {'k': int(neighbors[0].shape[1])} if neighbors is not None else None,
+        'bounds': {
+            'min': np.asarray(embedding_3d).min(axis=0).astype(float).tolist() if len(ids) else [0, 0, 0],
+            'max': np.asarray(embedding_3d).max(axis=0).astype(float).tolist() if len(ids) else [0, 0, 0],
+        },
+    })
+
+
+def _read_json(path):
+    with open(path, mode="r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _write_json(path, payload):
+    with open(path, mode="w", encoding="utf-8") as file:
+        json.dump(payload, file, separators=(",", ":"))
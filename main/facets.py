@@ -0,0 +1,135 @@
+import os
+import json
+import numpy as np
+
+from store import save_array
+
+# Posting lists for filtered search: for every tag and every galaxy
+# cluster, the sorted rows that carry it. A filter is intersected from
+# these before anything is scored, so a "vegetarian + 30-minutes-or-less"
+# search only ever looks at the recipes that pass it.
+#
+#   facets/tags.json            tag names, a tag's id is its position
+#   facets/tag_offsets.npy      tag t lists tag_rows[offsets[t]:offsets[t + 1]]
+#   facets/tag_rows.npy         int32 rows, sorted within each tag
+#   facets/cluster_offsets.npy  same for the cluster ids of the palette
+#   facets/cluster_rows.npy
+
+
+def _postings(keys, rows, n_keys):
+    """
+    Groups (key, row) pairs into offsets + rows. Rows are given in row
+    order, the stable sort keeps them sorted within every key.
+    """
+    order = np.argsort(keys, kind='stable')
+    offsets = np.searchsorted(keys[order], np.arange(n_keys + 1)).astype(np.int64)
+    rows = rows[order]
+    return offsets, rows.astype(np.int32 if len(rows) == 0 or rows.max() < 2 ** 31 else np.int64)
+
+
+def intersect(lists):
+    """
+    Rows in every one of the sorted lists. Works up from the shortest list
+    and binary-searches the longer ones, so the cost follows the smallest.
+    """
+    lists = sorted(lists, key=len)
+    rows = np.asarray(lists[0], dtype=np.int64)
+    for other in lists[1:]:
+        if not len(rows):
+            break
+        # other is at least as long as rows, so it isn't empty here
+        slots = np.searchsorted(other, rows).clip(max=len(other) - 1)
+        rows = rows[other[slots] == rows]
+    return rows
+
+
+class FacetIndex:
+
+    def __init__(self, tags, tag_offsets, tag_rows, cluster_offsets, cluster_rows):
+        self.tags = tags
+        self.tag_of = {tag: t for t, tag in enumerate(tags)}
+        self.tag_offsets = tag_offsets
+        self.tag_rows = tag_rows
+        self.cluster_offsets = cluster_offsets
+        self.cluster_rows = cluster_rows
+
+    def __len__(self):
+        # Every row has exactly one cluster
+        return int(self.cluster_offsets[-1])
+
+    @classmethod
+    def build(cls, tag_lists, cluster_ids):
+        """
+        tag_lists may be a one-shot iterator, it is read once.
+        """
+        index = cls([], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32),
+                    np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32))
+        index.extend(tag_lists, cluster_ids)
+        return index
+
+    def extend(self, tag_lists, cluster_ids):
+        """
+        Adds rows len(self), len(self) + 1, ... Tags never seen before get
+        new ids after the existing ones.
+        """
+        first_row = len(self)
+        keys, rows = [], []
+        for row, tags in enumerate(tag_lists, start=first_row):
+            for tag in dict.fromkeys(tags):
+                if tag not in self.tag_of:
+                    self.tag_of[tag] = len(self.tags)
+                    self.tags.append(tag)
+                keys.append(self.tag_of[tag])
+                rows.append(row)
+
+        old_keys = np.repeat(np.arange(len(self.tag_offsets) - 1), np.diff(self.tag_offsets))
+        self.tag_offsets, self.tag_rows = _postings(
+            np.concatenate([old_keys, np.asarray(keys, dtype=np.int64)]),
+            np.concatenate([self.tag_rows, np.asarray(rows, dtype=np.int64)]), len(self.tags))
+
+        cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+        old_keys = np.repeat(np.arange(len(self.cluster_offsets) - 1), np.diff(self.cluster_offsets))
+        keys = np.concatenate([old_keys, cluster_ids])
+        self.cluster_offsets, self.cluster_rows = _postings(
+            keys, np.concatenate([self.cluster_rows, first_row + np.arange(len(cluster_ids))]),
+            int(keys.max()) + 1 if len(keys) else 0)
+
+    def tag_postings(self, tag):
+        t = self.tag_of.get(tag)
+        if t is None:
+            return self.tag_rows[:0]
+        return self.tag_rows[self.tag_offsets[t]:self.tag_offsets[t + 1]]
+
+    def cluster_postings(self, cluster_id):
+        if not 0 <= cluster_id < len(self.cluster_offsets) - 1:
+            return self.cluster_rows[:0]
+        return self.cluster_rows[self.cluster_offsets[cluster_id]:self.cluster_offsets[cluster_id + 1]]
+
+    def filter(self, tags=(), cluster_ids=()):
+        """
+        Sorted rows that have every tag and are in any of the clusters.
+        None when there is nothing to filter on, i.e. every row passes.
+        """
+        lists = [self.tag_postings(tag) for tag in tags]
+        if len(cluster_ids):
+            # A row is in exactly one cluster, so the union is a plain merge
+            lists.append(np.sort(np.concatenate([self.cluster_postings(c) for c in cluster_ids])))
+        if not lists:
+            return None
+        return intersect(lists)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "tags.json"), mode="w", encoding="utf-8") as file:
+            json.dump(self.tags, file)
+        for name, array in (("tag_offsets.npy", self.tag_offsets), ("tag_rows.npy", self.tag_rows),
+                            ("cluster_offsets.npy", self.cluster_offsets), ("cluster_rows.npy", self.cluster_rows)):
+            save_array(path, name, array)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "tags.json"), mode="r", encoding="utf-8") as file:
+            tags = json.load(file)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        return cls(tags, load("tag_offsets.npy"), load("tag_rows.npy"),
+                   load("cluster_offsets.npy"), load("cluster_rows.npy"))
@@ -0,0 +1,51 @@
+from export import spool_line
+from normalize import clean_ingredient, pretokenized, recipe_tokens
+from ontology import ONTOLOGY
+
+# TF-IDF settings of the build, the benches fit with the same ones
+TFIDF_PARAMS = dict(max_df=0.90, min_df=5)
+
+
+def pantry_query(ingredients):
+    """
+    Turns a list of pantry ingredients ("Soy Sauce", "garlic") into a query
+    string that hits the same tokens the recipes were indexed with.
+    """
+    return " ".join(clean_ingredient(item.lower()) for item in ingredients if item.strip())
+
+
+def fit_tfidf(token_lists, params=TFIDF_PARAMS):
+    """
+    Returns (TfidfVectorizer, matrix) fitted on token lists. Documents are
+    already split, so TF-IDF skips re-tokenizing the joined strings; the
+    word analyzer is switched back on afterwards so search queries can
+    still be plain strings.
+    """
+    # Search imports this module too, only fitting needs sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(analyzer=pretokenized, **params)
+    matrix = vectorizer.fit_transform(token_lists)
+    return vectorizer.set_params(analyzer='word'), matrix
+
+
+def build_features(recipe):
+    """
+    Returns the feature string (cleaned ingredients + TAG_ tokens) for one recipe.
+    """
+    # Clean ingredients
+    ingreds = [clean_ingredient(item) for item in recipe.ingredients]
+
+    # Clean tags
+    tags = ["TAG_" + tag.replace(" ", "_") for tag in recipe.tags]
+
+    return " ".join(ingreds + tags)
+
+
+def featurize_chunk(recipes):
+    """
+    Everything the pipeline keeps from a chunk of recipes: the TF-IDF token
+    lists, the uint8 cluster ids and the spool text for the export.
+    """
+    tokens = [recipe_tokens(recipe) for recipe in recipes]
+    cluster_ids = ONTOLOGY.assign_ids([recipe.tags for recipe in recipes])
+    return tokens, cluster_ids, "".join(map(spool_line, recipes))
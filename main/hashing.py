@@ -0,0 +1,209 @@
+import os
+import json
+import shutil
+import tempfile
+from numbers import Integral
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from normalize import pretokenized
+from store import save_array
+
+# Hashed column space before the df filter. Two terms sharing a column are
+# merged, at 2**20 columns that stays rare for a vocabulary of a few 10k terms
+N_FEATURES = 1 << 20
+
+# Rows rewritten per block when the spooled counts become the final matrix
+BLOCK_ROWS = 1 << 16
+
+
+def df_filter(df, n_docs, max_df, min_df):
+    """
+    max_df/min_df with TfidfVectorizer's rules: ints are document counts,
+    floats are proportions of the corpus. Returns the mask of kept terms.
+    """
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    keep = (df > 0) & (df <= max_doc_count) & (df >= min_doc_count)
+    if not keep.any():
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+    return keep
+
+
+class HashingTfidf:
+    """
+    TF-IDF over hashed tokens for corpora whose token lists don't fit in
+    memory. partial_fit() takes one chunk of token lists at a time: the raw
+    counts go to a spool on disk and only the document frequencies stay in
+    memory. finish() applies max_df/min_df exactly like TfidfVectorizer,
+    renumbers the surviving columns 0..n-1 and streams the weighted,
+    l2-normalized CSR into .npy files that are opened memory-mapped.
+
+    transform() mirrors TfidfVectorizer.transform, so search, append mode
+    and the server don't care which engine built the index.
+    """
+
+    def __init__(self, max_df=1.0, min_df=1, n_features=N_FEATURES, analyzer='word', dtype=np.float64):
+        self.max_df = max_df
+        self.min_df = min_df
+        self.n_features = n_features
+        # float32 halves the matrix (test5.py --compact)
+        self.dtype = np.dtype(dtype)
+        self.hasher = HashingVectorizer(n_features=n_features, analyzer=analyzer,
+                                        alternate_sign=False, norm=None)
+        self.work_dir = None
+
+    def set_params(self, analyzer):
+        self.hasher.set_params(analyzer=analyzer)
+        return self
+
+    def _count(self, token_lists):
+        # Duplicates are already summed, so every stored entry is one document
+        hasher = HashingVectorizer(n_features=self.n_features, analyzer=pretokenized,
+                                   alternate_sign=False, norm=None)
+        return hasher.transform(token_lists)
+
+    def partial_fit(self, token_lists):
+        counts = self._count(token_lists)
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix="hashing-")
+            self.n_docs_ = 0
+            self.df_ = np.zeros(self.n_features, dtype=np.int64)
+            self.term_counts_ = np.zeros(self.n_features, dtype=np.float64)
+
+        self.n_docs_ += counts.shape[0]
+        self.df_ += np.bincount(counts.indices, minlength=self.n_features)
+        self.term_counts_ += np.bincount(counts.indices, weights=counts.data, minlength=self.n_features)
+        for name, values in (("indices", counts.indices.astype(np.int32)),
+                             ("counts", counts.data.astype(np.int32)),
+                             ("lengths", np.diff(counts.indptr).astype(np.int64))):
+            with open(os.path.join(self.work_dir, name), mode="ab") as file:
+                file.write(values.tobytes())
+        return self
+
+    def _set_columns(self, columns, idf):
+        self.columns_ = columns
+        self.idf_ = idf
+        self.column_of_ = np.full(self.n_features, -1, dtype=np.int32)
+        self.column_of_[columns] = np.arange(len(columns), dtype=np.int32)
+
+    def finish(self, out_dir):
+        """
+        Writes the fitted matrix to out_dir and returns it memory-mapped.
+        """
+        if self.work_dir is None:
+            raise ValueError("partial_fit was never called")
+        keep = df_filter(self.df_, self.n_docs_, self.max_df, self.min_df)
+        # Smooth idf, as TfidfVectorizer computes it
+        idf = np.log((1 + self.n_docs_) / (1 + self.df_[keep])) + 1
+        self._set_columns(np.flatnonzero(keep).astype(np.int32), idf)
+        self.oov_rate_ = float(1 - self.term_counts_[keep].sum() / max(self.term_counts_.sum(), 1))
+
+        indices = np.memmap(os.path.join(self.work_dir, "indices"), dtype=np.int32, mode="r")
+        counts = np.memmap(os.path.join(self.work_dir, "counts"), dtype=np.int32, mode="r")
+        lengths = np.fromfile(os.path.join(self.work_dir, "lengths"), dtype=np.int64)
+        spool_indptr = np.concatenate([[0], np.cumsum(lengths)])
+
+        # First pass only counts what survives the filter, so the output
+        # files can be allocated at their final size
+        kept_per_row = np.empty(len(lengths), dtype=np.int64)
+        for start in range(0, len(lengths), BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, len(lengths))
+            kept = np.concatenate([[0], np.cumsum(keep[indices[spool_indptr[start]:spool_indptr[end]]])])
+            bounds = spool_indptr[start:end + 1] - spool_indptr[start]
+            kept_per_row[start:end] = kept[bounds[1:]] - kept[bounds[:-1]]
+        # scipy wants indices and indptr in one dtype, anything else is copied
+        index_dtype = np.int32 if kept_per_row.sum() < 2 ** 31 else np.int64
+        indptr = np.concatenate([[0], np.cumsum(kept_per_row)]).astype(index_dtype)
+
+        os.makedirs(out_dir, exist_ok=True)
+        out_data = np.lib.format.open_memmap(os.path.join(out_dir, "data.npy"), mode="w+",
+                                             dtype=self.dtype, shape=(int(indptr[-1]),))
+        out_indices = np.lib.format.open_memmap(os.path.join(out_dir, "indices.npy"), mode="w+",
+                                                dtype=index_dtype, shape=(int(indptr[-1]),))
+        np.save(os.path.join(out_dir, "indptr.npy"), indptr)
+
+        for start in range(0, len(lengths), BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, len(lengths))
+            lo, hi = spool_indptr[start], spool_indptr[end]
+            block = sp.csr_matrix((counts[lo:hi].astype(np.float64), indices[lo:hi],
+                                   spool_indptr[start:end + 1] - lo), shape=(end - start, self.n_features))
+            block = self._weigh(block)
+            out_data[indptr[start]:indptr[end]] = block.data
+            out_indices[indptr[start]:indptr[end]] = block.indices
+        out_data.flush()
+        out_indices.flush()
+        del out_data, out_indices, indices, counts
+
+        self.close()
+        return read_csr(out_dir, len(self.idf_))
+
+    def close(self):
+        """
+        Drops the spooled counts, e.g. when a cached matrix is used instead.
+        """
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    def _weigh(self, counts):
+        """
+        Hashed counts -> kept columns, times idf, l2-normalized rows.
+        """
+        columns = self.column_of_[counts.indices]
+        kept = columns >= 0
+        kept_before = np.concatenate([[0], np.cumsum(kept)])
+        matrix = sp.csr_matrix((counts.data[kept] * self.idf_[columns[kept]], columns[kept],
+                                kept_before[counts.indptr]), shape=(counts.shape[0], len(self.idf_)))
+        return normalize(matrix.astype(self.dtype, copy=False), copy=False)
+
+    def transform(self, raw_documents):
+        return self._weigh(self.hasher.transform(raw_documents))
+
+    def oov_rate(self, token_lists):
+        """
+        Share of tokens that land in a column the fit dropped.
+        """
+        counts = self._count(token_lists)
+        total = counts.data.sum()
+        return float(counts.data[self.column_of_[counts.indices] < 0].sum() / total) if total else 0.0
+
+    def save(self, path):
+        with open(os.path.join(path, "hashing.json"), mode="w", encoding="utf-8") as file:
+            json.dump({'max_df': self.max_df, 'min_df': self.min_df, 'n_features': self.n_features,
+                       'oov_rate': self.oov_rate_, 'dtype': self.dtype.name}, file)
+        np.save(os.path.join(path, "columns.npy"), self.columns_)
+        np.save(os.path.join(path, "idf.npy"), self.idf_)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "hashing.json"), mode="r", encoding="utf-8") as file:
+            meta = json.load(file)
+        vectorizer = cls(meta['max_df'], meta['min_df'], meta['n_features'], dtype=meta.get('dtype', "float64"))
+        vectorizer.oov_rate_ = meta['oov_rate']
+        vectorizer._set_columns(np.load(os.path.join(path, "columns.npy")), np.load(os.path.join(path, "idf.npy")))
+        return vectorizer
+
+
+def is_hashed(path):
+    return os.path.exists(os.path.join(path, "hashing.json"))
+
+
+def write_csr(path, matrix):
+    """
+    CSR as three .npy files so it can be opened memory-mapped, each one
+    written with store.save_array.
+    """
+    matrix = matrix.tocsr()
+    for name, values in (("data", matrix.data), ("indices", matrix.indices), ("indptr", matrix.indptr)):
+        save_array(path, f"{name}.npy", values)
+
+
+def read_csr(path, n_columns):
+    arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("data", "indices", "indptr")]
+    return sp.csr_matrix(tuple(arrays), shape=(len(arrays[2]) - 1, n_columns), copy=False)
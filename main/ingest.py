@@ -0,0 +1,48 @@
+import csv
+from collections import namedtuple
+
+from parsing import parse_list
+
+# Only the columns the galaxy pipeline actually uses. Everything else in the
+# CSV row (description, nutrition, ...) is dropped as soon as the row is read.
+Recipe = namedtuple('Recipe', ['id', 'name', 'ingredients', 'tags', 'steps'])
+
+
+def parse_recipe(row):
+    """
+    Turns one csv.DictReader row into a compact Recipe with real Python lists.
+    Each list column is decoded exactly once here, callers keep the result.
+    """
+    return Recipe(
+        id=row['id'],
+        name=row['name'],
+        ingredients=parse_list(row['ingredients']),
+        tags=parse_list(row['tags']),
+        steps=parse_list(row['steps']),
+    )
+
+
+def iter_recipes(path, limit=None):
+    """
+    Yields parsed recipes one at a time. limit=None reads the whole file.
+    """
+    with open(path, mode="r", encoding="utf-8", newline="") as file:
+        reader = csv.DictReader(file)
+        for i, row in enumerate(reader):
+            if limit is not None and i >= limit: break
+            yield parse_recipe(row)
+
+
+def iter_chunks(path, chunk_size=10000, limit=None):
+    """
+    Groups iter_recipes into lists of at most chunk_size recipes so memory
+    is bounded by the chunk size instead of the corpus size.
+    """
+    chunk = []
+    for recipe in iter_recipes(path, limit):
+        chunk.append(recipe)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
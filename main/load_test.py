@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote
+
+PANTRY = [
+    "chicken", "garlic", "soy sauce", "ginger", "flour", "sugar", "eggs", "butter", "chocolate",
+    "ground beef", "kidney beans", "chili powder", "onion", "tomatoes", "olive oil", "rice", "pasta",
+    "parmesan cheese", "basil", "shrimp", "lemon juice", "cumin", "tortillas", "black beans", "milk",
+]
+
+
+def make_pantry(rng, pool):
+    """
+    A random pantry, or with a pool one of its pantries typed differently:
+    shuffled order and random casing, like real repeat traffic.
+    """
+    if not pool:
+        return rng.sample(PANTRY, rng.randint(2, 5))
+    pantry = list(rng.choice(pool))
+    rng.shuffle(pantry)
+    return [item.title() if rng.random() < 0.5 else item for item in pantry]
+
+
+async def get(reader, writer, host, target):
+    """
+    One GET on a keep-alive connection, returns (status, decoded JSON body).
+    """
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, requests, seed, latencies, statuses, pool=()):
+    """
+    One keep-alive connection issuing its share of /search requests back to back.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            ingredients = ",".join(make_pantry(rng, pool))
+            start = time.perf_counter()
+            status, _ = await get(reader, writer, host, f"/search?ingredients={quote(ingredients)}&k=5")
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+async def run(args):
+    latencies, statuses = [], {}
+    per_client = max(1, args.requests // args.concurrency)
+    rng = random.Random(args.concurrency)
+    pool = [rng.sample(PANTRY, rng.randint(2, 5)) for _ in range(args.repeat_pool)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, per_client, seed, latencies, statuses, pool)
+                           for seed in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests over {args.concurrency} connections in {elapsed:.2f}s")
+    print(f"  throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(f"  latency ms: p50 {percentile(latencies, 50) * 1000:.2f} | "
+          f"p95 {percentile(latencies, 95) * 1000:.2f} | p99 {percentile(latencies, 99) * 1000:.2f} | "
+          f"max {latencies[-1] * 1000:.2f}")
+    print(f"  status codes: {dict(sorted(statuses.items()))}")
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        status, stats = await get(reader, writer, args.host, "/stats")
+    finally:
+        writer.close()
+    if status == 200:
+        cache = stats['query_cache']
+        print(f"  query cache: {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for server.py on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--repeat-pool", type=int, default=0,
+                        help="draw every query from this many pantries, reordered and recased (0 = all random)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
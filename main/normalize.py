@@ -0,0 +1,66 @@
+import re
+from functools import lru_cache
+
+prep_words = ['diced ', 'chopped ', 'crushed ', 'minced ', 'sliced ', 'ground ']
+
+# All prep words in one pass. None of them can overlap another, so a single
+# regex removes exactly the occurrences the old replace loop removed
+PREP_PATTERN = re.compile("|".join(re.escape(word) for word in prep_words))
+
+# Same tokenization TfidfVectorizer applies to the joined feature strings
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# The same few thousand ingredient strings repeat across the whole corpus
+CACHE_SIZE = 1 << 16
+
+
+def _replace_loop(item):
+    for word in prep_words:
+        item = item.replace(word, "")
+    return item
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_ingredient(item):
+    """
+    Strips prep words and turns the ingredient into one underscored token.
+    """
+    cleaned = PREP_PATTERN.sub("", item)
+    if PREP_PATTERN.search(cleaned):
+        # Removing one prep word spelled out another ("grodiced und "),
+        # the old loop's order decides what survives
+        cleaned = _replace_loop(item)
+    return cleaned.strip().replace(" ", "_")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def ingredient_tokens(item):
+    """
+    TF-IDF tokens of one cleaned ingredient, e.g. 'salt & pepper' -> ('salt_', '_pepper').
+    """
+    return tuple(TOKEN_PATTERN.findall(clean_ingredient(item).lower()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def tag_tokens(tag):
+    return tuple(TOKEN_PATTERN.findall(("TAG_" + tag.replace(" ", "_")).lower()))
+
+
+def recipe_tokens(recipe):
+    """
+    Pre-tokenized features for one recipe: exactly the tokens the default
+    TfidfVectorizer analyzer would pull out of build_features(recipe).
+    """
+    tokens = []
+    for item in recipe.ingredients:
+        tokens.extend(ingredient_tokens(item))
+    for tag in recipe.tags:
+        tokens.extend(tag_tokens(tag))
+    return tokens
+
+
+def pretokenized(tokens):
+    """
+    TfidfVectorizer analyzer for documents that are already token lists.
+    """
+    return tokens
@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import numpy as np
+
+# Level-of-detail tiles for the galaxy viewer. Every octree node stores a
+# representative random sample of at most `capacity` of its stars, leaves
+# store all of theirs. The page draws coarse nodes when they are far away
+# and swaps in the children as the camera gets closer, so the number of
+# vertices on screen stays bounded whatever the corpus size.
+#
+#   tiles/tiles.json     tree: bounds, star count, sample size and children per node
+#   tiles/<node>.bin     float32 x/y/z[n], uint32 row[n], uint8 cluster id[n]
+
+TILE_CAPACITY = 4096
+MAX_DEPTH = 12
+
+
+def build_octree(positions, capacity=TILE_CAPACITY, max_depth=MAX_DEPTH, seed=42):
+    """
+    Returns {node_id: {'min', 'max', 'count', 'rows', 'children'}}. Node ids
+    are the path from the root ('r', 'r3', 'r37', ...), rows are the sample.
+    """
+    positions = np.asarray(positions, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    nodes = {}
+    if len(positions) == 0:
+        return nodes
+
+    # Cubic root cell so children stay cubes
+    low = positions.min(axis=0)
+    size = float((positions.max(axis=0) - low).max()) or 1.0
+    stack = [('r', np.arange(len(positions)), low, size, 0)]
+
+    while stack:
+        node_id, rows, low, size, depth = stack.pop()
+        node = {'min': low.tolist(), 'max': (low + size).tolist(), 'count': int(len(rows)), 'children': []}
+        nodes[node_id] = node
+
+        if len(rows) <= capacity or depth >= max_depth:
+            node['rows'] = rows
+            continue
+        node['rows'] = np.sort(rng.choice(rows, size=capacity, replace=False))
+
+        # Octant of every star: one bit per axis
+        half = size / 2
+        center = low + half
+        octant = ((positions[rows] >= center) * np.array([1, 2, 4])).sum(axis=1)
+        order = np.argsort(octant, kind='stable')
+        bounds = np.searchsorted(octant[order], np.arange(9))
+        for child in range(8):
+            child_rows = rows[order[bounds[child]:bounds[child + 1]]]
+            if len(child_rows) == 0:
+                continue
+            offset = np.array([child & 1, (child >> 1) & 1, (child >> 2) & 1], dtype=np.float32) * half
+            child_id = f"{node_id}{child}"
+            node['children'].append(child_id)
+            stack.append((child_id, child_rows, low + offset, half, depth + 1))
+
+    return nodes
+
+
+def write_tiles(out_dir, positions, cluster_ids, capacity=TILE_CAPACITY):
+    tile_dir = os.path.join(out_dir, "tiles")
+    shutil.rmtree(tile_dir, ignore_errors=True)
+    os.makedirs(tile_dir)
+
+    positions = np.asarray(positions, dtype='<f4')
+    nodes = build_octree(positions, capacity)
+    for node_id, node in nodes.items():
+        rows = node.pop('rows')
+        node['n'] = int(len(rows))
+        with open(os.path.join(tile_dir, f"{node_id}.bin"), mode="wb") as file:
+            file.write(np.ascontiguousarray(positions[rows]).tobytes())
+            file.write(rows.astype('<u4').tobytes())
+            file.write(np.asarray(cluster_ids, dtype=np.uint8)[rows].tobytes())
+
+    with open(os.path.join(tile_dir, "tiles.json"), mode="w", encoding="utf-8") as file:
+        json.dump({'root': 'r', 'capacity': capacity, 'nodes': nodes}, file, separators=(",", ":"))
+    return nodes
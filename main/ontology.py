@@ -0,0 +1,114 @@
+from itertools import chain
+
+import numpy as np
+
+TAG_ONTOLOGY = {
+    # Plant-Based (Greens)
+    'vegan':       {'cluster': 'Vegan Sector',       'color': '#00ff00'}, 
+    'vegetarian':  {'cluster': 'Vegetarian Sector',  'color': '#228b22'}, 
+    
+    # Baking & Sweets (Purples & Pinks)
+    'dessert':     {'cluster': 'Dessert Core',       'color': '#ff00ff'}, 
+    'baking':      {'cluster': 'Baking Sector',      'color': '#9370db'}, 
+    'cookie':      {'cluster': 'Cookie Cluster',     'color': '#ffb6c1'}, 
+    
+    # World Cuisine (Warm Colors: Reds, Oranges, Yellows)
+    'mexican':     {'cluster': 'Mexican Cuisine',    'color': '#ff4500'}, 
+    'asian':       {'cluster': 'Asian Cuisine',      'color': '#ff8c00'}, 
+    'indian':      {'cluster': 'Indian Cuisine',     'color': '#ffd700'}, 
+    'italian':     {'cluster': 'Italian Cuisine',    'color': '#dc143c'}, 
+    
+    # Core Proteins (Blues)
+    'seafood':     {'cluster': 'Seafood System',     'color': '#00ffff'}, 
+    'poultry':     {'cluster': 'Poultry System',     'color': '#1e90ff'}, 
+    'beef':        {'cluster': 'Beef System',        'color': '#000080'}, 
+}
+
+def assign_ontology(tags_list):
+    """
+    Scans a recipe's tags and returns its assigned Cluster Name and Color.
+    """
+    if not tags_list:
+        return 'Deep Space', '#444444' # Dark grey for uncategorized
+        
+    t_str = " ".join([t.lower() for t in tags_list])
+    
+    for target_tag, properties in TAG_ONTOLOGY.items():
+        if target_tag in t_str:
+            return properties['cluster'], properties['color']
+            
+    return 'General Savory Space', '#444444'
+
+
+UNCATEGORIZED = {'cluster': 'Deep Space', 'color': '#444444'}
+DEFAULT = {'cluster': 'General Savory Space', 'color': '#444444'}
+
+
+class CompiledOntology:
+    """
+    assign_ontology compiled into a tag -> cluster lookup table.
+
+    A recipe's cluster only depends on which ontology targets appear inside
+    its tags, and Food.com only has a few hundred distinct tags, so each
+    distinct tag is scanned once and its best (lowest) priority memoized.
+    A recipe's cluster is then the minimum priority over its tags, which
+    keeps the dict order priority and the substring matching ('beef' hits
+    'ground-beef') of assign_ontology.
+
+    Cluster ids index self.palette: the targets in priority order, then
+    'General Savory Space', then 'Deep Space' for recipes with no tags.
+    """
+
+    def __init__(self, ontology=TAG_ONTOLOGY):
+        for target in ontology:
+            # The original joins tags with spaces, a target with a space
+            # could match across two tags, which a per-tag table can't see
+            if " " in target:
+                raise ValueError(f"ontology target '{target}' must not contain spaces")
+        self.targets = list(ontology)
+        self.palette = [{'name': p['cluster'], 'color': p['color']}
+                        for p in list(ontology.values()) + [DEFAULT, UNCATEGORIZED]]
+        self.default_id = len(self.targets)
+        self.empty_id = len(self.targets) + 1
+        self._tag_ids = {}
+
+    def tag_id(self, tag):
+        cluster_id = self._tag_ids.get(tag)
+        if cluster_id is None:
+            lowered = tag.lower()
+            cluster_id = next((i for i, target in enumerate(self.targets) if target in lowered),
+                              self.default_id)
+            self._tag_ids[tag] = cluster_id
+        return cluster_id
+
+    def assign_id(self, tags_list):
+        if not tags_list:
+            return self.empty_id
+        return min(map(self.tag_id, tags_list))
+
+    def assign(self, tags_list):
+        """
+        Same (cluster name, color) answer as assign_ontology.
+        """
+        label = self.palette[self.assign_id(tags_list)]
+        return label['name'], label['color']
+
+    def assign_ids(self, tag_lists):
+        """
+        Cluster ids (uint8) for a whole batch of recipes at once.
+        """
+        lengths = np.fromiter(map(len, tag_lists), dtype=np.int64, count=len(tag_lists))
+        ids = np.full(len(tag_lists), self.empty_id, dtype=np.uint8)
+        tagged = lengths > 0
+        if tagged.any():
+            flat_tags = list(chain.from_iterable(tag_lists))
+            for tag in set(flat_tags).difference(self._tag_ids):
+                self.tag_id(tag)
+            # Every tag is in the table now, so this is a plain C-level lookup
+            flat = np.fromiter(map(self._tag_ids.__getitem__, flat_tags), dtype=np.uint8, count=len(flat_tags))
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            ids[tagged] = np.minimum.reduceat(flat, starts[tagged])
+        return ids
+
+
+ONTOLOGY = CompiledOntology()
@@ -0,0 +1,173 @@
+import os
+import json
+from collections import Counter
+import numpy as np
+
+from features import pantry_query
+from normalize import clean_ingredient
+from search import top_k
+from store import save_array
+
+# "What can I cook with what I have": every recipe's ingredient set as a
+# packed bitset over the ingredient vocabulary, so coverage and missing
+# counts for the whole corpus are a handful of AND + popcount passes.
+#
+#   pantry/vocabulary.json   ingredient keys in bit order (most common first)
+#   pantry/bits.npy          uint64[words, recipes], bit b of word w = ingredient 64*w + b
+#   pantry/sizes.npy         uint16 ingredient count per recipe, rare ingredients included
+#
+# bits is stored word-major: a query only reads the rows of the words its
+# own ingredients fall in, and those pages are all it maps in.
+
+# Ingredients in fewer recipes than this get no bit. They still count in
+# the recipe's size, you just can't have them.
+MIN_DF = 5
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        # numpy < 2.0: count per byte through a lookup table
+        return _BYTE_COUNTS[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def ingredient_key(item):
+    """
+    Same normalization the features use, so "Minced Garlic" matches "garlic".
+    """
+    return clean_ingredient(item.strip().lower())
+
+
+class PantryIndex:
+
+    def __init__(self, vocabulary, bits, sizes):
+        self.vocabulary = vocabulary
+        self.bit_of = {key: bit for bit, key in enumerate(vocabulary)}
+        self.bits = bits
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @classmethod
+    def build(cls, ingredient_lists, min_df=MIN_DF):
+        """
+        ingredient_lists may be a one-shot iterator, it is read once.
+        """
+        key_sets = [{ingredient_key(item) for item in ingredients if item.strip()} for ingredients in ingredient_lists]
+        df = Counter(key for keys in key_sets for key in keys)
+        vocabulary = [key for key, count in sorted(df.items(), key=lambda pair: (-pair[1], pair[0])) if count >= min_df]
+        index = cls(vocabulary, np.zeros(((len(vocabulary) + 63) // 64, 0), dtype=np.uint64),
+                    np.zeros(0, dtype=np.uint16))
+        index._add_sets(key_sets)
+        return index
+
+    def extend(self, ingredient_lists):
+        """
+        Adds recipes with the existing vocabulary, as append mode does.
+        """
+        self._add_sets([{ingredient_key(item) for item in ingredients if item.strip()}
+                        for ingredients in ingredient_lists])
+
+    def _add_sets(self, key_sets):
+        rows, bit_ids = [], []
+        for row, keys in enumerate(key_sets):
+            for key in keys:
+                bit = self.bit_of.get(key)
+                if bit is not None:
+                    rows.append(row)
+                    bit_ids.append(bit)
+        rows, bit_ids = np.asarray(rows, dtype=np.int64), np.asarray(bit_ids, dtype=np.int64)
+
+        bits = np.zeros((self.bits.shape[0], len(key_sets)), dtype=np.uint64)
+        # Each (recipe, ingredient) pair is unique, so add is the same as or
+        np.add.at(bits, (bit_ids // 64, rows), np.left_shift(np.uint64(1), (bit_ids % 64).astype(np.uint64)))
+        sizes = np.fromiter((len(keys) for keys in key_sets), dtype=np.uint16, count=len(key_sets))
+        self.bits = np.hstack([self.bits, bits])
+        self.sizes = np.concatenate([self.sizes, sizes])
+
+    def encode(self, ingredients):
+        """
+        Query bitset as {word: mask}, plus the keys that have no bit.
+        """
+        masks, unknown = {}, []
+        for item in ingredients:
+            if not item.strip():
+                continue
+            bit = self.bit_of.get(ingredient_key(item))
+            if bit is None:
+                unknown.append(ingredient_key(item))
+            else:
+                masks[bit // 64] = masks.get(bit // 64, 0) | (1 << (bit % 64))
+        return masks, unknown
+
+    def coverage(self, ingredients, rows=None):
+        """
+        (have, missing) for every recipe: how many of its ingredients are in
+        the pantry and how many are not. With rows, only for those recipes.
+        """
+        masks, _ = self.encode(ingredients)
+        sizes = self.sizes if rows is None else self.sizes[rows]
+        have = np.zeros(len(sizes), dtype=np.uint16)
+        for word, mask in masks.items():
+            words = self.bits[word] if rows is None else self.bits[word][rows]
+            have += popcount(words & np.uint64(mask))
+        return have, sizes - have
+
+    def search(self, ingredients, top_k_results=10, relevance=None, blend=0.0, rows=None):
+        """
+        Recipes that use at least one pantry ingredient, fewest missing
+        first. Ties go to the recipe using more of the pantry. With
+        relevance=(rows, cosine scores) and blend > 0 the score becomes
+        blend * cosine - missing, so each unit of blend is worth one missing
+        ingredient. rows, sorted, limits the search to those recipes.
+        Returns (rows, have, missing, scores).
+        """
+        have, missing = self.coverage(ingredients, rows)
+        hits = np.flatnonzero(have)
+        score = -missing[hits].astype(np.float64)
+        if relevance is not None and blend:
+            cosine = np.zeros(len(self))
+            cosine[relevance[0]] = relevance[1]
+            score += blend * cosine[hits if rows is None else rows[hits]]
+        else:
+            # Integer ranks, the tie-break on have stays exact
+            score += have[hits] / (int(self.sizes.max(initial=0)) + 1)
+        # rows is sorted, so ties on position are ties on row too
+        hits, score = top_k(hits, score, top_k_results)
+        return hits if rows is None else rows[hits], have[hits], missing[hits], score
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "vocabulary.json"), mode="w", encoding="utf-8") as file:
+            json.dump(self.vocabulary, file)
+        save_array(path, "bits.npy", self.bits)
+        save_array(path, "sizes.npy", self.sizes)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "vocabulary.json"), mode="r", encoding="utf-8") as file:
+            vocabulary = json.load(file)
+        return cls(vocabulary, np.load(os.path.join(path, "bits.npy"), mmap_mode="r"),
+                   np.load(os.path.join(path, "sizes.npy"), mmap_mode="r"))
+
+
+def search_pantry(pantry, index, vectorizer, ingredients, top_k_results=10, blend=0.0, rows=None):
+    """
+    Pantry counterpart of search.search_queries for one ingredient list.
+    index is an exact SearchIndex, used for ids, clusters and the TF-IDF
+    relevance when blending.
+    """
+    relevance = index.score(vectorizer.transform([pantry_query(ingredients)]), rows) if blend else None
+    rows, have, missing, scores = pantry.search(ingredients, top_k_results, relevance, blend, rows)
+    return {
+        'rows': rows.tolist(),
+        'ids': index.ids[rows].tolist(),
+        'have': have.tolist(),
+        'missing': missing.tolist(),
+        'scores': scores.tolist(),
+        'clusters': index.cluster_labels(rows),
+        'unknown': pantry.encode(ingredients)[1],
+    }
@@ -0,0 +1,113 @@
+import io
+import os
+import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from features import featurize_chunk
+from ingest import parse_recipe
+
+# Target bytes per work item. Small enough to keep every worker busy and
+# the results streaming back in order, big enough to amortize the IPC.
+RANGE_BYTES = 8 << 20
+
+
+def split_ranges(path, parts, block_size=1 << 20):
+    """
+    Splits the CSV body into about `parts` byte ranges that each start on a
+    record boundary. Quoted fields (descriptions, steps) can contain
+    newlines, so a newline only ends a record when the number of '"' seen
+    since the header is even. Returns (header fieldnames, [(start, end), ...]).
+    """
+    size = os.path.getsize(path)
+    with open(path, mode="rb") as file:
+        header = file.readline()
+        data_start = file.tell()
+        targets = [data_start + (size - data_start) * k // parts for k in range(1, parts)]
+        cuts = [data_start]
+
+        pos = data_start
+        quotes = 0
+        t = 0
+        while t < len(targets):
+            block = file.read(block_size)
+            if not block:
+                break
+            counted = 0
+            q = quotes
+            while t < len(targets):
+                start = targets[t] - pos
+                if start >= len(block):
+                    break
+                found = False
+                i = block.find(b"\n", max(start, counted))
+                while i != -1:
+                    q += block.count(b'"', counted, i)
+                    counted = i
+                    if q % 2 == 0:
+                        cuts.append(pos + i + 1)
+                        found = True
+                        break
+                    i = block.find(b"\n", i + 1)
+                if not found:
+                    # Record boundary is in a later block
+                    break
+                t += 1
+                # A long record can swallow several targets
+                while t < len(targets) and targets[t] < cuts[-1]:
+                    t += 1
+            quotes = q + block.count(b'"', counted)
+            pos += len(block)
+
+    cuts.append(size)
+    fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+    return fieldnames, [(a, b) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+def process_range(path, start, end, fieldnames):
+    """
+    Worker: parses and featurizes one byte range. Newlines are single bytes
+    in UTF-8, so every range is valid UTF-8 on its own.
+    """
+    with open(path, mode="rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames)
+    return featurize_chunk([parse_recipe(row) for row in reader])
+
+
+def iter_feature_chunks(path, workers, limit=None):
+    """
+    Parallel version of featurize_chunk over the whole CSV. Yields the same
+    (tokens, cluster ids, spool text) chunks in file order, so the merged
+    result is identical to the serial pass.
+    """
+    parts = max(workers * 4, os.path.getsize(path) // RANGE_BYTES)
+    fieldnames, ranges = split_ranges(path, parts)
+    remaining = limit
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        ranges = iter(ranges)
+        # Keep a bounded window of work in flight so memory stays flat
+        # and a --limit run stops submitting once it has enough rows
+        for start, end in ranges:
+            pending.append(pool.submit(process_range, path, start, end, fieldnames))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            tokens, cluster_ids, spool_text = pending.popleft().result()
+            if remaining is not None and len(tokens) >= remaining:
+                lines = spool_text.splitlines(keepends=True)[:remaining]
+                yield tokens[:remaining], cluster_ids[:remaining], "".join(lines)
+                for future in pending:
+                    future.cancel()
+                return
+            if remaining is not None:
+                remaining -= len(tokens)
+            yield tokens, cluster_ids, spool_text
+
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(process_range, path, *next_range, fieldnames))
@@ -0,0 +1,52 @@
+import ast
+
+
+def parse_list(text):
+    """
+    Decodes a Python list-of-strings literal like "['a', 'b']", which is how
+    the Food.com CSV stores its tags/ingredients/steps columns.
+
+    Anything outside the plain repr() format (escapes, numbers, nesting...)
+    falls back to ast.literal_eval so the result is always identical.
+    """
+    result = _parse_string_list(text)
+    if result is None:
+        return ast.literal_eval(text)
+    return result
+
+
+def _parse_string_list(text):
+    # Backslashes mean escaped quotes/newlines, leave those to ast
+    if '\\' in text or text[:1] != '[' or text[-1:] != ']':
+        return None
+    if text == '[]':
+        return []
+
+    # repr() only switches to double quotes when an item contains a single
+    # quote, so without any '"' every item is '...' and a split is exact
+    if '"' not in text:
+        if text[:2] != "['" or text[-2:] != "']":
+            return None
+        items = text[2:-2].split("', '")
+        # Any other spacing ("['a','b']") leaves quotes inside the items
+        if text.count("'") != 2 * len(items):
+            return None
+        return items
+
+    items = []
+    last = len(text) - 1
+    i = 1
+    while True:
+        quote = text[i]
+        if quote != "'" and quote != '"':
+            return None
+        end = text.find(quote, i + 1)
+        if end < 0 or end >= last:
+            return None
+        items.append(text[i + 1:end])
+        i = end + 1
+        if i == last:
+            return items
+        if not text.startswith(', ', i) or i + 2 >= last:
+            return None
+        i += 2
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import argparse
+
+# Stage by stage comparison of two build timing reports (see profiling.py).
+#   python profile_diff.py                         last two runs in .galaxy_reports/history.jsonl
+#   python profile_diff.py old.json new.json
+#   python profile_diff.py --fail                  exit code 1 on a regression, for scripts
+
+METRICS = [("wall_s", "WALL (s)"), ("cpu_s", "CPU (s)"), ("peak_rss_mb", "PEAK RSS (MB)"), ("rows_per_s", "ROWS/S")]
+
+
+def load_history(report_dir, count=2):
+    path = os.path.join(report_dir, "history.jsonl")
+    if not os.path.exists(path):
+        raise SystemExit(f"no report history in {report_dir}, run test5.py first")
+    with open(path, mode="r", encoding="utf-8") as file:
+        reports = [json.loads(line) for line in file if line.strip()]
+    if len(reports) < count:
+        raise SystemExit(f"{path} has {len(reports)} run(s), need {count} to compare")
+    return reports[-count:]
+
+
+def load_report(path):
+    with open(path, mode="r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def worse(metric, before, after, threshold, slack):
+    """
+    True when the change is a regression: slower, more memory or fewer rows/s
+    by more than threshold (relative) and slack (absolute, for tiny numbers).
+    """
+    if before is None or after is None:
+        return False
+    if metric == "rows_per_s":
+        return after < before / (1 + threshold) and before - after > slack
+    return after > before * (1 + threshold) and after - before > slack
+
+
+def diff(old, new, threshold, slack):
+    """
+    Prints the table and returns the regressed (stage, metric) pairs.
+    """
+    old_stages = {stage['stage']: stage for stage in old['stages']}
+    regressions = []
+    print(f"old: {old['started']}  {old.get('command') or ''}")
+    print(f"new: {new['started']}  {new.get('command') or ''}")
+    if old.get('command') != new.get('command'):
+        print("note: the runs used different arguments")
+    print()
+    print(f"{'STAGE':<11} | {'METRIC':<13} | {'OLD':>10} | {'NEW':>10} | {'CHANGE':>8}")
+    print("-" * 64)
+    for stage in new['stages']:
+        before = old_stages.get(stage['stage'])
+        if before is None:
+            print(f"{stage['stage']:<11} | new stage")
+            continue
+        # A cache hit on one side makes the timings incomparable
+        note = ""
+        if before.get('cache_hit') != stage.get('cache_hit'):
+            note = "  (cache hit on one run only)"
+        for metric, label in METRICS:
+            a, b = before.get(metric), stage.get(metric)
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a:+.0%}" if a else "-"
+            flag = ""
+            # Rates of stages that take no time at all are noise
+            quick = metric == "rows_per_s" and max(before['wall_s'], stage['wall_s']) < slack['wall_s']
+            if not note and not quick and worse(metric, a, b, threshold, slack.get(metric, 0.0)):
+                regressions.append((stage['stage'], metric))
+                flag = "  <- regression"
+            print(f"{stage['stage']:<11} | {label:<13} | {a:>10.2f} | {b:>10.2f} | {change:>8}{flag}{note}")
+    change = f"{(new['wall_s'] - old['wall_s']) / old['wall_s']:+.0%}" if old['wall_s'] else "-"
+    print(f"{'total':<11} | {'WALL (s)':<13} | {old['wall_s']:>10.2f} | {new['wall_s']:>10.2f} | {change:>8}")
+
+    # Structure sizes, in reports that have them
+    old_structures = old.get('structures', {})
+    for name, structure in new.get('structures', {}).items():
+        before = old_structures.get(name)
+        if before is None:
+            continue
+        a, b = before['mb'], structure['mb']
+        change = f"{(b - a) / a:+.0%}" if a else "-"
+        flag = ""
+        if worse("mb", a, b, threshold, slack['mb']):
+            regressions.append((name, "mb"))
+            flag = "  <- regression"
+        kinds = f"  ({before['kind']} -> {structure['kind']})" if before['kind'] != structure['kind'] else ""
+        print(f"{name:<11} | {'MB':<13} | {a:>10.2f} | {b:>10.2f} | {change:>8}{flag}{kinds}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two galaxy build timing reports")
+    parser.add_argument("reports", nargs="*", help="old and new report JSON, default: last two runs in the history")
+    parser.add_argument("--report-dir", default=".galaxy_reports")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change that counts as a regression")
+    parser.add_argument("--fail", action="store_true", help="exit with code 1 when anything regressed")
+    args = parser.parse_args()
+
+    if len(args.reports) == 2:
+        old, new = map(load_report, args.reports)
+    elif not args.reports:
+        old, new = load_history(args.report_dir)
+    else:
+        raise SystemExit("pass two reports, or none to use the history")
+
+    # Changes smaller than this are noise whatever the percentage
+    slack = {'wall_s': 0.5, 'cpu_s': 0.5, 'peak_rss_mb': 50.0, 'rows_per_s': 0.0, 'mb': 1.0}
+    regressions = diff(old, new, args.threshold, slack)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        if args.fail:
+            sys.exit(1)
+    else:
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stage timings for the galaxy build. Every stage records wall time, CPU
+# time (worker processes included), peak RSS and rows/s; the run ends up
+# as one JSON report plus a line in history.jsonl, which profile_diff.py
+# compares across runs:
+#   <report dir>/build-<timestamp>.json     this run
+#   <report dir>/history.jsonl              every run, one report per line
+#   <report dir>/<stage>.prof / .txt        cProfile + tracemalloc dump of the --profile stage
+# The report also lists the size of the big structures the build held
+# (token lists, TF-IDF matrix, embedding...), so a peak can be explained.
+
+REPORT_VERSION = 1
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+
+def _reset_peak_rss():
+    """
+    Linux lets a process reset its RSS high-water mark, so each stage gets
+    its own peak. Returns False where that isn't possible.
+    """
+    try:
+        with open("/proc/self/clear_refs", mode="w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status", mode="r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def structure_size(obj):
+    """
+    (bytes, kind) of an array, a sparse matrix, a tuple of arrays, an
+    object with an nbytes attribute or a list of token lists. Strings are
+    counted once however many lists share them.
+    """
+    if hasattr(obj, "indptr"):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes, f"{obj.data.dtype}/{obj.indices.dtype}"
+    if isinstance(obj, tuple):
+        sizes = [structure_size(part) for part in obj]
+        return sum(size for size, _ in sizes), "/".join(kind for _, kind in sizes)
+    if hasattr(obj, "dtype"):
+        return obj.nbytes, str(obj.dtype)
+    if hasattr(obj, "nbytes"):
+        return obj.nbytes, type(obj).__name__
+    size, strings = sys.getsizeof(obj), {}
+    for tokens in obj:
+        size += sys.getsizeof(tokens)
+        for token in tokens:
+            strings[id(token)] = token
+    return size + sum(sys.getsizeof(token) for token in strings.values()), "list of lists"
+
+
+class BuildProfile:
+    """
+    with profile.stage("umap", "Running UMAP projection") as info:
+        ...
+        info['rows'] = n
+
+    Prints the banner like before, times the block and keeps the result.
+    info takes any extra JSON-able facts about the stage (rows, cache hit).
+    """
+
+    def __init__(self, report_dir=None, profile_stage=None, command=None):
+        self.report_dir = report_dir
+        self.profile_stage = profile_stage
+        self.command = command
+        self.stages = []
+        self.structures = {}
+        self.started = time.time()
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, key, banner):
+        print(banner)
+        info = {}
+        per_stage_peak = _reset_peak_rss()
+        profiler = None
+        if key == self.profile_stage:
+            profiler = cProfile.Profile()
+            tracemalloc.start()
+            profiler.enable()
+
+        cpu, wall = _cpu_seconds(), time.perf_counter()
+        try:
+            yield info
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = _cpu_seconds() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self._dump(key, profiler)
+            rows = info.pop('rows', None)
+            self.stages.append({
+                'stage': key,
+                'wall_s': round(wall, 4),
+                'cpu_s': round(cpu, 4),
+                'peak_rss_mb': round(_peak_rss_mb() or 0.0, 1),
+                # Without a per-stage reset the peak is the process's so far
+                'rss_scope': "stage" if per_stage_peak else "process",
+                'rows': rows,
+                'rows_per_s': round(rows / wall, 1) if rows and wall > 0 else None,
+                **info,
+            })
+
+    def structure(self, name, obj):
+        """
+        Records how much memory one of the build's data structures takes.
+        """
+        size, kind = structure_size(obj)
+        self.structures[name] = {'mb': round(size / (1024 * 1024), 2), 'kind': kind}
+
+    def _dump(self, key, profiler):
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        os.makedirs(self.report_dir, exist_ok=True)
+        prof_path = os.path.join(self.report_dir, f"{key}.prof")
+        profiler.dump_stats(prof_path)
+
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        text.write(f"\nPeak traced Python allocations: {traced_peak / 1e6:.1f} MB\n")
+        text.write(f"Top {TOP_ALLOCATIONS} allocation sites still held at the end of the stage:\n")
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            text.write(f"{stat}\n")
+        text_path = os.path.join(self.report_dir, f"{key}.txt")
+        with open(text_path, mode="w", encoding="utf-8") as file:
+            file.write(text.getvalue())
+        print(f"  profile of '{key}' written to {prof_path} and {text_path}")
+
+    def report(self):
+        return {
+            'version': REPORT_VERSION,
+            'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            'command': self.command,
+            'wall_s': round(time.perf_counter() - self.start, 4),
+            'peak_rss_mb': round(max((stage['peak_rss_mb'] for stage in self.stages), default=0.0), 1),
+            'stages': self.stages,
+            'structures': self.structures,
+        }
+
+    def summary(self):
+        report = self.report()
+        print(f"\n{'STAGE':<12} | {'WALL (s)':<9} | {'CPU (s)':<9} | {'PEAK RSS (MB)':<13} | {'ROWS/S'}")
+        print("-" * 62)
+        for stage in report['stages']:
+            rate = f"{stage['rows_per_s']:.0f}" if stage['rows_per_s'] else "-"
+            print(f"{stage['stage']:<12} | {stage['wall_s']:<9.2f} | {stage['cpu_s']:<9.2f} | "
+                  f"{stage['peak_rss_mb']:<13.1f} | {rate}")
+        print(f"{'total':<12} | {report['wall_s']:<9.2f}")
+        if self.structures:
+            print(f"\n{'STRUCTURE':<16} | {'MB':<9} | {'KIND'}")
+            print("-" * 46)
+            for name, structure in self.structures.items():
+                print(f"{name:<16} | {structure['mb']:<9.2f} | {structure['kind']}")
+
+    def save(self):
+        """
+        Writes this run's report and adds it to the history. Returns the path.
+        """
+        if not self.report_dir:
+            return None
+        report = self.report()
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"build-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}.json")
+        with open(path, mode="w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        with open(os.path.join(self.report_dir, "history.jsonl"), mode="a", encoding="utf-8") as file:
+            file.write(json.dumps(report) + "\n")
+        return path
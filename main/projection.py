@@ -0,0 +1,143 @@
+import os
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import cache
+
+# Scalable UMAP: fit the reducer on a sample balanced across galaxy
+# clusters, then place every other row with reducer.transform in batches,
+# optionally spread over worker processes. The fit is what grows badly
+# with the row count; transform is per row and parallelizes cleanly.
+# umap and sklearn are imported where they're used, a build that hits the
+# UMAP cache never loads numba.
+
+TRANSFORM_BATCH = 4096
+EVAL_ROWS = 2000
+EVAL_NEIGHBORS = 15
+
+
+def stratified_sample(cluster_ids, size, seed=42):
+    """
+    Sorted rows, about `size` of them, split as evenly as possible across
+    the cluster ids. Clusters smaller than their share give their leftover
+    to the bigger ones, so the sample always has min(size, rows) rows.
+    """
+    cluster_ids = np.asarray(cluster_ids)
+    if size >= len(cluster_ids):
+        return np.arange(len(cluster_ids))
+    rng = np.random.default_rng(seed)
+    clusters, counts = np.unique(cluster_ids, return_counts=True)
+
+    # Water-fill: every cluster gets the same quota unless it runs out of rows
+    quota = np.zeros(len(clusters), dtype=np.int64)
+    left = size
+    while left > 0:
+        open_clusters = np.flatnonzero(quota < counts)
+        share = max(left // len(open_clusters), 1)
+        for c in open_clusters:
+            take = min(share, counts[c] - quota[c], left)
+            quota[c] += take
+            left -= take
+            if not left:
+                break
+
+    rows = [rng.choice(np.flatnonzero(cluster_ids == cluster), quota[c], replace=False)
+            for c, cluster in enumerate(clusters) if quota[c]]
+    return np.sort(np.concatenate(rows))
+
+
+_worker_reducer = None
+
+
+def _load_worker(path):
+    global _worker_reducer
+    _worker_reducer = cache.read_reducer(path)
+
+
+def _transform(rows):
+    return _worker_reducer.transform(rows)
+
+
+def transform_batches(reducer, matrix, batch_size=TRANSFORM_BATCH, workers=1):
+    """
+    reducer.transform over matrix rows in batches, in order. With workers > 1
+    every process loads its own copy of the reducer once and gets batches
+    from a bounded window, like parallel.iter_feature_chunks.
+    """
+    if not matrix.shape[0]:
+        return np.empty((0, reducer.n_components), dtype=np.float32)
+    starts = range(0, matrix.shape[0], batch_size)
+    if workers <= 1:
+        return np.vstack([reducer.transform(matrix[start:start + batch_size]) for start in starts])
+
+    with tempfile.TemporaryDirectory(prefix="galaxy-umap-") as tmp:
+        path = os.path.join(tmp, "reducer.pkl")
+        cache.write_reducer(path, reducer)
+        results = []
+        # Spawned, not forked: a fork copies numba's thread pool mid-state
+        # and the parent can then hang on its locks at exit
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_load_worker, initargs=(path,)) as pool:
+            pending = deque()
+            for start in starts:
+                pending.append(pool.submit(_transform, matrix[start:start + batch_size]))
+                if len(pending) >= workers * 2:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+    return np.vstack(results)
+
+
+def sample_fit(tfidf_matrix, cluster_ids, sample_size, params, batch_size=TRANSFORM_BATCH, workers=1):
+    """
+    Returns (reducer, embedding, sample rows). The sampled rows keep the
+    coordinates of the fit, the rest are projected into the same space.
+    """
+    import umap
+
+    sample = stratified_sample(cluster_ids, sample_size, seed=params.get('random_state') or 0)
+    reducer = umap.UMAP(**params)
+    fitted = reducer.fit_transform(tfidf_matrix[sample])
+
+    rest = np.ones(tfidf_matrix.shape[0], dtype=bool)
+    rest[sample] = False
+    embedding = np.empty((tfidf_matrix.shape[0], fitted.shape[1]), dtype=fitted.dtype)
+    embedding[sample] = fitted
+    embedding[rest] = transform_batches(reducer, tfidf_matrix[rest], batch_size, workers)
+    return reducer, embedding, sample
+
+
+def neighbor_report(tfidf_matrix, embeddings, n_rows=EVAL_ROWS, n_neighbors=EVAL_NEIGHBORS, seed=42):
+    """
+    How well each 3D embedding keeps the TF-IDF neighborhoods, on the same
+    random subset of rows: trustworthiness (1.0 = no false neighbors) and
+    the share of each row's k cosine neighbors that stay among its k
+    nearest stars. embeddings is {name: array}, returns {name: {...}}.
+    """
+    from sklearn.manifold import trustworthiness
+    from sklearn.neighbors import NearestNeighbors
+
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(tfidf_matrix.shape[0], min(n_rows, tfidf_matrix.shape[0]), replace=False))
+    subset = tfidf_matrix[rows]
+    n_neighbors = min(n_neighbors, len(rows) // 2 - 1)
+
+    def neighbors(points, metric):
+        model = NearestNeighbors(n_neighbors=n_neighbors + 1, metric=metric).fit(points)
+        # The first hit is the row itself
+        return model.kneighbors(points, return_distance=False)[:, 1:]
+
+    truth = neighbors(subset, "cosine")
+    report = {}
+    for name, embedding in embeddings.items():
+        points = np.asarray(embedding[rows], dtype=np.float64)
+        found = neighbors(points, "euclidean")
+        kept = np.mean([len(np.intersect1d(a, b, assume_unique=True)) for a, b in zip(truth, found)]) / n_neighbors
+        report[name] = {
+            'trustworthiness': float(trustworthiness(subset, points, n_neighbors=n_neighbors, metric="cosine")),
+            'knn_preservation': float(kept),
+        }
+    return report
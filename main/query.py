@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import scipy.sparse as sp
+
+from facets import FacetIndex
+from features import pantry_query
+from normalize import TOKEN_PATTERN
+from pantry import PantryIndex
+from search import SearchIndex, search_queries
+from store import RecipeStore
+
+# Searching a saved galaxy without the build stack. The vocabulary, IDF
+# weights and TF-IDF matrix are read straight from the index dir and
+# queries are vectorized here, so nothing heavier than NumPy/SciPy is
+# imported: no sklearn, no umap, no numba JIT. server.py loads through here.
+#   python query.py chicken garlic "soy sauce"
+#   python query.py --index-dir galaxy_index --k 10 eggs,flour,milk
+
+
+class QueryVectorizer:
+    """
+    TfidfVectorizer.transform of a fitted vocabulary with the default word
+    analyzer: lowercase, tokens of two or more word characters, raw counts
+    times idf, l2-normalized rows. Enough for search, not for fitting.
+    """
+
+    def __init__(self, terms, idf, dtype=np.float64):
+        self.vocabulary_ = {term: column for column, term in enumerate(terms)}
+        self.dtype = np.dtype(dtype)
+        self.idf_ = np.asarray(idf, dtype=self.dtype)
+
+    def get_feature_names_out(self):
+        return np.asarray(list(self.vocabulary_), dtype=object)
+
+    def transform(self, raw_documents):
+        indptr, indices, counts = [0], [], []
+        for document in raw_documents:
+            row = {}
+            for token in TOKEN_PATTERN.findall(document.lower()):
+                column = self.vocabulary_.get(token)
+                if column is not None:
+                    row[column] = row.get(column, 0) + 1
+            for column in sorted(row):
+                indices.append(column)
+                counts.append(row[column])
+            indptr.append(len(indices))
+
+        data = np.asarray(counts, dtype=self.dtype) * self.idf_[np.asarray(indices, dtype=np.int32)]
+        lengths = np.diff(indptr)
+        # Row norms, empty rows stay empty
+        norms = np.sqrt(np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=data * data,
+                                    minlength=len(lengths))).astype(self.dtype)
+        norms[norms == 0] = 1.0
+        data /= np.repeat(norms, lengths)
+        return sp.csr_matrix((data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+                             shape=(len(lengths), len(self.idf_)))
+
+
+def read_query_tfidf(index_dir, params):
+    """
+    (QueryVectorizer, TF-IDF matrix) of an index dir. Only hashed indexes
+    need sklearn's hasher, they load the hashing engine instead.
+    """
+    if os.path.exists(os.path.join(index_dir, "hashing.json")):
+        from hashing import HashingTfidf, read_csr
+        vectorizer = HashingTfidf.load(index_dir)
+        return vectorizer, read_csr(index_dir, len(vectorizer.idf_))
+    with open(os.path.join(index_dir, "vocabulary.json"), mode="r", encoding="utf-8") as file:
+        terms = json.load(file)
+    vectorizer = QueryVectorizer(terms, np.load(os.path.join(index_dir, "idf.npy")), params.get('dtype', "float64"))
+    return vectorizer, sp.load_npz(os.path.join(index_dir, "tfidf.npz")).tocsr()
+
+
+def load_index(index_dir, read_tfidf=read_query_tfidf):
+    """
+    Loads a saved galaxy. Returns a dict with the manifest, the vectorizer,
+    the TF-IDF matrix and the memory-mapped recipe store, whose per-row
+    arrays are also exposed as embedding/ids/cluster_ids. read_tfidf
+    restores the TF-IDF stage, artifacts.load_index passes one that gives
+    back the full sklearn vectorizer.
+    """
+    with open(os.path.join(index_dir, "manifest.json"), mode="r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    vectorizer, tfidf_matrix = read_tfidf(index_dir, manifest['tfidf_params'])
+    store = RecipeStore(os.path.join(index_dir, "store"))
+    return {
+        'dir': index_dir,
+        'manifest': manifest,
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'store': store,
+        'embedding': store.positions,
+        'ids': store.ids,
+        'cluster_ids': store.clusters,
+        'pantry': PantryIndex.load(os.path.join(index_dir, "pantry")),
+        'facets': FacetIndex.load(os.path.join(index_dir, "facets")),
+        'palette': manifest['palette'],
+        # Cluster name per cluster id, for search results
+        'cluster_names': np.asarray([label['name'] for label in manifest['palette']]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a saved galaxy from the command line")
+    parser.add_argument("ingredients", nargs="+", help="pantry ingredients, separate words or comma lists")
+    parser.add_argument("--index-dir", default="galaxy_index")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    galaxy = load_index(args.index_dir)
+    index = SearchIndex(galaxy['tfidf_matrix'], ids=galaxy['ids'],
+                        clusters=galaxy['cluster_ids'], cluster_names=galaxy['cluster_names'])
+    loaded = time.perf_counter()
+    ingredients = [item for value in args.ingredients for item in value.split(",") if item.strip()]
+    result = search_queries(index, galaxy['vectorizer'], [pantry_query(ingredients)], args.k)[0]
+    done = time.perf_counter()
+
+    for rank, (row, score, cluster) in enumerate(zip(result['rows'], result['scores'], result['clusters']), 1):
+        print(f"{rank:>2}. {galaxy['store'].name(row)}  ({score:.3f}, {cluster})")
+    print(f"index loaded in {loaded - start:.2f}s, query took {(done - loaded) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
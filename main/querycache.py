@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+
+from pantry import ingredient_key
+
+# Search results keyed by what the query means rather than how it was
+# typed: "Minced Garlic, chicken" and "chicken,garlic" are the same pantry,
+# so the second one is served without vectorizing or scoring anything.
+
+
+def canonical_ingredients(ingredients):
+    """
+    Sorted, deduplicated ingredient keys, normalized like the features
+    (lowercase, prep words stripped, spaces to underscores).
+    """
+    return tuple(sorted({ingredient_key(item) for item in ingredients if item.strip()}))
+
+
+class QueryCache:
+    """
+    Bounded LRU of search results with a time to live. Every entry belongs
+    to the index version it was computed on, a lookup with another version
+    empties the cache first. Not thread safe, the server only touches it
+    from the event loop.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """
+        The cached result or None. Counts a hit or a miss.
+        """
+        self._check_version(version)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self.entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version, result):
+        if self.max_entries <= 0:
+            return
+        self._check_version(version)
+        self.entries[key] = (self.clock() + self.ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl,
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
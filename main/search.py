@@ -0,0 +1,143 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+def l2_normalize(matrix):
+    """
+    Row-normalizes a sparse matrix so a dot product is the cosine similarity.
+    Empty rows stay empty.
+    """
+    matrix = sp.csr_matrix(matrix, copy=True)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    # Keeps float32 matrices float32
+    return sp.diags((1.0 / norms).astype(np.result_type(matrix.dtype, np.float32), copy=False)) @ matrix
+
+
+def top_k(rows, scores, k):
+    """
+    Best k (row, score) pairs by score, ties broken by the lower row.
+    Only partitions, the full candidate list is never sorted.
+    """
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= kth
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+def brute_force_search(query_vector, matrix, top_k_results=3):
+    """
+    The old search_galaxy scoring: cosine against every recipe.
+    Kept as the reference the index has to agree with.
+    """
+    query = l2_normalize(query_vector)
+    scores = (l2_normalize(matrix) @ query.T).toarray().ravel()
+    rows = np.flatnonzero(scores > 0)
+    return top_k(rows, scores[rows], top_k_results)
+
+
+class SearchIndex:
+    """
+    Inverted index over the L2-normalized TF-IDF matrix. A query only
+    touches the posting lists of its own terms, so recipes that share
+    nothing with it are never scored.
+    """
+
+    def __init__(self, tfidf_matrix, ids=None, clusters=None, cluster_names=None):
+        self.matrix = l2_normalize(tfidf_matrix).tocsr()
+        # CSC is the inverted index: column j lists every recipe that has term j
+        self.postings = self.matrix.tocsc()
+        self.postings.sort_indices()
+        # Per-row metadata returned with batch results
+        self.ids = np.asarray(ids) if ids is not None else np.arange(len(self))
+        self.clusters = np.asarray(clusters) if clusters is not None else None
+        # clusters can be compact ids into cluster_names instead of one label per row
+        self.cluster_names = np.asarray(cluster_names) if cluster_names is not None else None
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def cluster_labels(self, rows):
+        if self.clusters is None:
+            return None
+        if self.cluster_names is None:
+            return self.clusters[rows].tolist()
+        return self.cluster_names[self.clusters[rows]].tolist()
+
+    def score(self, query_vector, rows=None):
+        """
+        Returns (candidate rows, cosine scores) for one 1 x V query vector.
+        rows, a sorted array from a facet filter, restricts the candidates.
+        """
+        query = l2_normalize(query_vector)
+        if rows is not None:
+            # Only the filtered rows are scored, however common the query terms are
+            scores = (self.matrix[rows] @ query.T).toarray().ravel()
+            positive = scores > 0
+            return np.asarray(rows, dtype=np.int64)[positive], scores[positive]
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+
+        starts, ends = indptr[query.indices], indptr[query.indices + 1]
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Gather every posting of every query term in one go
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        hit_rows = indices[offsets]
+        hit_scores = data[offsets] * np.repeat(query.data, lengths)
+
+        rows, inverse = np.unique(hit_rows, return_inverse=True)
+        return rows, np.bincount(inverse, weights=hit_scores)
+
+    def search(self, query_vector, top_k_results=3, rows=None):
+        """
+        Returns (rows, scores) of the best matches, best first.
+        """
+        rows, scores = self.score(query_vector, rows)
+        return top_k(rows, scores, top_k_results)
+
+    def search_batch(self, query_matrix, top_k_results=3, rows=None):
+        """
+        Scores a whole B x V batch of queries with one sparse x sparse
+        product and returns one (rows, scores) pair per query. rows
+        restricts every query of the batch to the same filtered rows.
+        """
+        if rows is None:
+            # postings.T is the CSR form of matrix.T, so no conversion happens here
+            scores = (l2_normalize(query_matrix) @ self.postings.T).tocsr()
+            rows = np.arange(len(self))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = (l2_normalize(query_matrix) @ self.matrix[rows].T).tocsr()
+        results = []
+        for q in range(scores.shape[0]):
+            start, end = scores.indptr[q], scores.indptr[q + 1]
+            columns, values = scores.indices[start:end], scores.data[start:end]
+            positive = values > 0
+            results.append(top_k(rows[columns[positive]], values[positive], top_k_results))
+        return results
+
+
+def search_queries(index, vectorizer, queries, top_k_results=3, rows=None):
+    """
+    Library entry point for pantry searches: vectorizes every query in a
+    single transform call, scores them in one batch and returns a dict per
+    query with the matching rows, recipe ids, scores and clusters. rows
+    (see FacetIndex.filter) limits every query to those recipes.
+    """
+    if not queries:
+        return []
+    results = []
+    batch = index.search_batch(vectorizer.transform(queries), top_k_results, rows=rows)
+    for query, (rows, scores) in zip(queries, batch):
+        results.append({
+            'query': query,
+            'rows': rows.tolist(),
+            'ids': index.ids[rows].tolist(),
+            'scores': scores.tolist(),
+            'clusters': index.cluster_labels(rows),
+        })
+    return results
@@ -0,0 +1,383 @@
+import os
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from ann import AnnIndex, DEFAULT_NPROBE
+from features import pantry_query
+from pantry import search_pantry
+from query import load_index
+from querycache import QueryCache, canonical_ingredients
+from search import SearchIndex, search_queries
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+MAX_TOP_K = 50
+
+
+class QueryBatcher:
+    """
+    Queues incoming searches and scores whatever arrived within a couple of
+    milliseconds as one batch in the worker pool, so concurrent requests
+    share a single transform call and sparse product.
+    """
+
+    def __init__(self, index, vectorizer, pool, max_batch=64, max_wait=0.002):
+        self.index = index
+        self.vectorizer = vectorizer
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+
+    async def submit(self, query, top_k):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((query, top_k, future))
+        return await future
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+
+            queries = [query for query, _, _ in batch]
+            top_k = max(k for _, k, _ in batch)
+            try:
+                # Scoring is numpy/scipy work, keep it off the event loop
+                results = await loop.run_in_executor(
+                    self.pool, search_queries, self.index, self.vectorizer, queries, top_k)
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            for (_, k, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result({key: value[:k] if isinstance(value, list) else value
+                                       for key, value in result.items()})
+
+
+class SearchServer:
+    """
+    Minimal HTTP/1.1 JSON service:
+        GET /search?ingredients=chicken,garlic,soy sauce&k=5
+        GET /search?ingredients=...&mode=pantry&blend=0.5   fewest missing ingredients first
+        GET /search?ingredients=...&tags=vegetarian,30-minutes-or-less&cluster=Italian Cuisine
+        GET /recipe/{id}
+        GET /health
+        GET /stats                                          query cache hits/misses
+    """
+
+    def __init__(self, galaxy, batcher, max_inflight=256, cache=None):
+        self.galaxy = galaxy
+        self.batcher = batcher
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.cache = cache if cache is not None else QueryCache(max_entries=0)
+        # Searches running right now by cache key, identical misses wait for the same one
+        self.pending = {}
+
+    def reload(self, galaxy, index):
+        """
+        Swaps in a rebuilt or appended index. Batches already running finish
+        on the old one, the new manifest version empties the query cache.
+        """
+        self.galaxy = galaxy
+        self.batcher.index = index
+        self.batcher.vectorizer = galaxy['vectorizer']
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                if len(parts) != 3:
+                    status, payload = 400, {'error': "malformed request line"}
+                    version = "HTTP/1.0"
+                else:
+                    method, target, version = parts
+                    status, payload = await self.respond(method, target)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                body = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Access-Control-Allow-Origin: *\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target):
+        if method != "GET":
+            return 405, {'error': "only GET is supported"}
+        # Shed load instead of queueing without bound
+        if self.inflight >= self.max_inflight:
+            return 503, {'error': "server busy, retry shortly"}
+
+        self.inflight += 1
+        try:
+            return await self.route(target)
+        except Exception as error:
+            return 500, {'error': str(error)}
+        finally:
+            self.inflight -= 1
+
+    async def route(self, target):
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+
+        if url.path == "/search":
+            ingredients = [item for value in params.get("ingredients", [])
+                           for item in value.split(",") if item.strip()]
+            if not ingredients:
+                return 400, {'error': "pass ?ingredients=a,b,c"}
+            try:
+                top_k = min(max(int(params.get("k", ["5"])[0]), 1), MAX_TOP_K)
+            except ValueError:
+                return 400, {'error': "k must be an integer"}
+
+            mode = params.get("mode", ["tfidf"])[0]
+            if mode not in ("tfidf", "pantry"):
+                return 400, {'error': "mode must be tfidf or pantry"}
+            try:
+                blend = float(params.get("blend", ["0"])[0]) if mode == "pantry" else 0.0
+            except ValueError:
+                return 400, {'error': "blend must be a number"}
+            rows, error = self.facet_rows(params)
+            if error:
+                return 400, {'error': error}
+
+            # Order, case, duplicates and prep words don't change the results,
+            # so they don't change the key either
+            canonical = canonical_ingredients(ingredients)
+            key = (mode, canonical, top_k, blend, self.facet_key(params))
+            version = self.galaxy['manifest']['version']
+            result = self.cache.get(key, version)
+            # A search started before a reload is not shared with requests after it
+            running = (version, key)
+            if result is None and running in self.pending:
+                result = await asyncio.shield(self.pending[running])
+            elif result is None:
+                task = self.pending[running] = asyncio.ensure_future(
+                    self.search(mode, list(canonical), top_k, blend, rows))
+                try:
+                    result = await asyncio.shield(task)
+                    self.cache.put(key, version, result)
+                finally:
+                    self.pending.pop(running, None)
+
+            response = self.format_search(ingredients, result)
+            if mode == "pantry":
+                for item, have, missing in zip(response['results'], result['have'], result['missing']):
+                    item.update(have=have, missing=missing)
+                response['unknown'] = result['unknown']
+            return 200, response
+
+        if url.path.startswith("/recipe/"):
+            store = self.galaxy['store']
+            row = store.row_of_id(unquote(url.path[len("/recipe/"):]))
+            if row is None:
+                return 404, {'error': "unknown recipe id"}
+            # One record from the memory-mapped store, nothing else is read
+            details = store.details(row)
+            x, y, z = store.positions[row]
+            label = self.galaxy['palette'][store.clusters[row]]
+            details.update({
+                'galaxy_cluster': label['name'],
+                'star_color': label['color'],
+                'x': float(x), 'y': float(y), 'z': float(z),
+            })
+            return 200, details
+
+        if url.path == "/stats":
+            return 200, {'inflight': self.inflight, 'query_cache': self.cache.stats()}
+
+        if url.path == "/health":
+            return 200, {'status': "ok", 'recipes': self.galaxy['manifest']['count'],
+                         'version': self.galaxy['manifest']['version']}
+
+        return 404, {'error': "unknown endpoint"}
+
+    async def search(self, mode, ingredients, top_k, blend, rows):
+        loop = asyncio.get_running_loop()
+        if mode == "pantry":
+            # Fewest missing ingredients first, one popcount pass over the whole corpus
+            exact = getattr(self.batcher.index, "exact", self.batcher.index)
+            return await loop.run_in_executor(
+                self.batcher.pool, search_pantry, self.galaxy['pantry'], exact,
+                self.batcher.vectorizer, ingredients, top_k, blend, rows)
+        if rows is None:
+            return await self.batcher.submit(pantry_query(ingredients), top_k)
+        # Filtered searches only score their own rows, they skip the shared batch
+        results = await loop.run_in_executor(
+            self.batcher.pool, search_queries, self.batcher.index, self.batcher.vectorizer,
+            [pantry_query(ingredients)], top_k, rows)
+        return results[0]
+
+    @staticmethod
+    def facet_key(params):
+        tags = sorted({tag.strip().lower() for value in params.get("tags", [])
+                       for tag in value.split(",") if tag.strip()})
+        names = sorted({name.strip().lower() for value in params.get("cluster", [])
+                        for name in value.split(",") if name.strip()})
+        return tuple(tags), tuple(names)
+
+    def facet_rows(self, params):
+        """
+        Rows passing the tags= (all of them) and cluster= (any of them)
+        filters, None without filters. Returns (rows, error).
+        """
+        tags = [tag.strip().lower() for value in params.get("tags", [])
+                for tag in value.split(",") if tag.strip()]
+        names = [name.strip().lower() for value in params.get("cluster", [])
+                 for name in value.split(",") if name.strip()]
+        facets = self.galaxy['facets']
+        unknown = [tag for tag in tags if tag not in facets.tag_of]
+        if unknown:
+            return None, f"unknown tag {unknown[0]!r}"
+        cluster_of = {label['name'].lower(): c for c, label in enumerate(self.galaxy['palette'])}
+        unknown = [name for name in names if name not in cluster_of]
+        if unknown:
+            return None, f"unknown cluster {unknown[0]!r}"
+        return facets.filter(tags, [cluster_of[name] for name in names]), None
+
+    def format_search(self, ingredients, result):
+        store = self.galaxy['store']
+        return {
+            'ingredients': ingredients,
+            'results': [{'id': str(recipe_id), 'name': store.name(row), 'score': round(score, 4), 'cluster': cluster}
+                        for row, recipe_id, score, cluster
+                        in zip(result['rows'], result['ids'], result['scores'], result['clusters'])],
+        }
+
+
+def open_index(args):
+    """
+    (galaxy, search index) of --index-dir, the IVF index over the exact one
+    with --ann. Raises ValueError when the files don't fit together yet.
+    """
+    # No sklearn/umap imports on this path, see query.py
+    galaxy = load_index(args.index_dir)
+    index = SearchIndex(galaxy['tfidf_matrix'], ids=galaxy['ids'],
+                        clusters=galaxy['cluster_ids'], cluster_names=galaxy['cluster_names'])
+    if args.ann:
+        path = os.path.join(args.index_dir, "ann.npz")
+        if not os.path.exists(path):
+            raise ValueError(f"{args.index_dir} has no ann.npz, build it with test5.py --ann")
+        # Candidates from the IVF lists, rescored exactly by the inverted index
+        index = AnnIndex.load(path, exact=index, nprobe=args.nprobe)
+        # A build saves ann.npz after the manifest
+        if len(index) != len(galaxy['ids']):
+            raise ValueError(f"ann.npz has {len(index)} rows, the manifest {len(galaxy['ids'])}")
+    return galaxy, index
+
+
+async def watch_index(app, args):
+    """
+    Polls manifest.json, which every build and --append writes last, and
+    reloads the index when it changes. A half-written index is retried on
+    the next poll while the old one keeps serving.
+    """
+    loop = asyncio.get_running_loop()
+    path = os.path.join(args.index_dir, "manifest.json")
+    seen = os.stat(path).st_mtime_ns
+    while True:
+        await asyncio.sleep(args.reload_s)
+        try:
+            changed = os.stat(path).st_mtime_ns
+            if changed == seen:
+                continue
+            # Loading is file reads and numpy work, keep it off the event loop
+            galaxy, index = await loop.run_in_executor(app.batcher.pool, open_index, args)
+        except (OSError, ValueError) as error:
+            print(f"  index reload failed, still serving version {app.galaxy['manifest']['version']}: {error}")
+            continue
+        seen = changed
+        app.reload(galaxy, index)
+        print(f"  reloaded version {galaxy['manifest']['version']}, {len(index)} recipes")
+
+
+async def serve(args):
+    print(f"Loading index from {args.index_dir}")
+    start = time.perf_counter()
+    try:
+        galaxy, index = open_index(args)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    print(f"  {len(index)} recipes ready in {time.perf_counter() - start:.2f}s")
+
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    batcher = QueryBatcher(index, galaxy['vectorizer'], pool, args.max_batch, args.batch_wait_ms / 1000)
+    app = SearchServer(galaxy, batcher, args.max_inflight, QueryCache(args.cache_size, args.cache_ttl))
+
+    # One batch consumer per worker so batches can run in parallel
+    tasks = [asyncio.create_task(batcher.run()) for _ in range(args.workers)]
+    if args.reload_s > 0:
+        tasks.append(asyncio.create_task(watch_index(app, args)))
+    server = await asyncio.start_server(app.handle, args.host, args.port)
+    print(f"Search engine listening on http://{args.host}:{args.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local recipe search service")
+    parser.add_argument("--index-dir", default="galaxy_index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="threads scoring query batches")
+    parser.add_argument("--max-batch", type=int, default=64, help="max queries scored together")
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0, help="how long to wait for a batch to fill")
+    parser.add_argument("--ann", action="store_true", help="search the approximate IVF index instead of every match")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF lists scanned per query, more = better recall")
+    parser.add_argument("--cache-size", type=int, default=10000, help="cached search results (0 = no cache)")
+    parser.add_argument("--cache-ttl", type=float, default=300.0, help="seconds a cached result stays valid")
+    parser.add_argument("--reload-s", type=float, default=5.0,
+                        help="seconds between manifest.json checks, picks up rebuilds and --append (0 = never)")
+    parser.add_argument("--max-inflight", type=int, default=256, help="requests beyond this get a 503")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import mmap
+import shutil
+import numpy as np
+
+# Recipe store the search server reads at query time, every file opened
+# memory-mapped so a lookup only touches the pages of the rows it returns:
+#   store.json       row count and how ids map to rows
+#   ids.npy          int64 recipe id per row
+#   positions.npy    float32 x/y/z per row
+#   clusters.npy     uint8 cluster id per row (index into the palette)
+#   strings.bin      name, ingredients JSON, steps JSON of every row back to back
+#   offsets.npy      int64 byte offsets into strings.bin, FIELDS per row plus the end
+#   id_table.npy     id -> row, either a direct table (id - id_base) or sorted ids + rows
+
+FIELDS = 3
+
+# A direct id -> row table is used while it's at most this many times the row count
+DIRECT_TABLE_SLACK = 8
+
+
+def _encode(details):
+    return (details['name'].encode("utf-8"),
+            json.dumps(details['ingredients']).encode("utf-8"),
+            json.dumps(details['steps']).encode("utf-8"))
+
+
+def write_store(path, records, positions, cluster_ids, append=False):
+    """
+    Writes display-ready detail records (see export.iter_details) with their
+    coordinates and cluster ids. With append=True the records extend the
+    rows already in the store, positions/cluster_ids still cover every row.
+    """
+    os.makedirs(path, exist_ok=True)
+    ids, offsets = [], [0]
+    if append:
+        ids = np.load(os.path.join(path, "ids.npy")).tolist()
+        offsets = np.load(os.path.join(path, "offsets.npy")).tolist()
+
+    # A server may still have strings.bin mapped, truncating that file under
+    # it is a SIGBUS on its next read. Write a copy and replace it instead
+    strings = os.path.join(path, "strings.bin")
+    tmp = f"{strings}.tmp-{os.getpid()}"
+    if append:
+        shutil.copyfile(strings, tmp)
+    try:
+        with open(tmp, mode="r+b" if append else "wb") as file:
+            # Drop anything a crashed append left past the last known row
+            file.truncate(offsets[-1])
+            file.seek(offsets[-1])
+            for details in records:
+                try:
+                    ids.append(int(details['id']))
+                except ValueError:
+                    raise ValueError(f"recipe id {details['id']!r} is not an integer") from None
+                for field in _encode(details):
+                    file.write(field)
+                    offsets.append(offsets[-1] + len(field))
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, strings)
+
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) != len(positions) or len(ids) != len(cluster_ids):
+        raise ValueError(f"{len(ids)} records for {len(positions)} positions and {len(cluster_ids)} cluster ids")
+    save_array(path, "ids.npy", ids)
+    save_array(path, "positions.npy", np.ascontiguousarray(positions, dtype=np.float32))
+    save_array(path, "clusters.npy", np.asarray(cluster_ids, dtype=np.uint8))
+    save_array(path, "offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+    meta = {'count': len(ids), 'lookup': "sorted", 'id_base': 0}
+    span = int(ids.max() - ids.min()) + 1 if len(ids) else 0
+    if span <= DIRECT_TABLE_SLACK * len(ids) + 1024:
+        # Later rows win, like a dict built in row order
+        table = np.full(span, -1, dtype=np.int32 if len(ids) < 2 ** 31 else np.int64)
+        table[ids - ids.min()] = np.arange(len(ids))
+        meta.update(lookup="table", id_base=int(ids.min()) if len(ids) else 0)
+    else:
+        order = np.argsort(ids, kind='stable')
+        table = np.stack([ids[order], order])
+    save_array(path, "id_table.npy", table)
+
+    # store.json goes last, a reader never sees a count without its rows
+    with open(os.path.join(path, "store.json"), mode="w", encoding="utf-8") as file:
+        json.dump(meta, file)
+
+
+def save_array(path, name, array):
+    """
+    np.save to path/name through a temporary file and os.replace. Replace
+    rather than overwrite, a live reader keeps its old mapping.
+    """
+    tmp = os.path.join(path, f"{name}.tmp-{os.getpid()}.npy")
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(path, name))
+
+
+class RecipeStore:
+    """
+    Read side of the store. Nothing is parsed up front: opening it maps the
+    files, lookups by row or id are O(1) and decode a single record.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "store.json"), mode="r", encoding="utf-8") as file:
+            meta = json.load(file)
+        self.path = path
+        self.count = meta['count']
+        self.lookup = meta['lookup']
+        self.id_base = meta['id_base']
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.ids = load("ids.npy")
+        self.positions = load("positions.npy")
+        self.clusters = load("clusters.npy")
+        self.offsets = load("offsets.npy")
+        self.id_table = load("id_table.npy")
+        with open(os.path.join(path, "strings.bin"), mode="rb") as file:
+            # mmap refuses empty files
+            self.strings = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return self.count
+
+    def row_of_id(self, recipe_id):
+        """
+        Row of a recipe id (int or numeric string), None if it isn't stored.
+        """
+        try:
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError):
+            return None
+        if self.lookup == "table":
+            slot = recipe_id - self.id_base
+            if 0 <= slot < len(self.id_table) and self.id_table[slot] >= 0:
+                return int(self.id_table[slot])
+            return None
+        sorted_ids, rows = self.id_table
+        # Rightmost match, so duplicated ids resolve to the later row
+        slot = np.searchsorted(sorted_ids, recipe_id, side="right") - 1
+        if slot >= 0 and sorted_ids[slot] == recipe_id:
+            return int(rows[slot])
+        return None
+
+    def __contains__(self, recipe_id):
+        return self.row_of_id(recipe_id) is not None
+
+    def _field(self, row, field):
+        start = self.offsets[row * FIELDS + field]
+        return self.strings[start:self.offsets[row * FIELDS + field + 1]].decode("utf-8")
+
+    def name(self, row):
+        return self._field(row, 0)
+
+    def details(self, row):
+        """
+        Same record export.iter_details produced for the row.
+        """
+        return {
+            'id': str(self.ids[row]),
+            'name': self.name(row),
+            'ingredients': json.loads(self._field(row, 1)),
+            'steps': json.loads(self._field(row, 2)),
+        }
+
+    def close(self):
+        if isinstance(self.strings, mmap.mmap):
+            self.strings.close()
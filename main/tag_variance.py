@@ -0,0 +1,155 @@
+import csv
+import time
+import argparse
+from collections import defaultdict
+import numpy as np
+import scipy.sparse as sp
+
+import artifacts
+
+# How tight every tag sits in the galaxy. Works off a saved index, so a
+# `test5.py --limit 0` build evaluates the whole corpus. The facet posting
+# lists already are the recipe x tag incidence matrix (in CSC form), and
+# every tag is evaluated at once from it:
+#   centroids        A.T @ X / counts
+#   average spread   mean |x - centroid| over each tag's recipes, one pass over the nonzeros of A
+#   density score    global spread / average spread, > 1 means tighter than the galaxy as a whole
+
+FIELDS = ['Tag', 'Recipe_Count', 'Average_Spread', 'Density_Score']
+
+
+def incidence_matrix(facets):
+    """
+    n_recipes x n_tags 0/1 matrix straight from the tag posting lists.
+    """
+    return sp.csc_matrix((np.ones(len(facets.tag_rows)), np.asarray(facets.tag_rows), np.asarray(facets.tag_offsets)),
+                         shape=(len(facets), len(facets.tags)))
+
+
+def tag_spread(incidence, embedding):
+    """
+    Returns (counts, centroids, average spread) for every tag column.
+    """
+    counts = np.asarray(incidence.sum(axis=0)).ravel()
+    safe = np.maximum(counts, 1)[:, None]
+    centroids = np.asarray(incidence.T @ embedding) / safe
+
+    # One distance per (recipe, tag) pair, the CSC layout gives them tag by tag
+    columns = np.repeat(np.arange(incidence.shape[1]), np.diff(incidence.indptr))
+    distances = np.linalg.norm(embedding[incidence.indices] - centroids[columns], axis=1)
+    # Sums per tag from the non-empty ones' starts only: each sum then runs
+    # exactly to the next non-empty tag, and empty tags stay 0
+    filled = np.diff(incidence.indptr) > 0
+    spread = np.zeros(len(counts))
+    if filled.any():
+        spread[filled] = np.add.reduceat(distances, incidence.indptr[:-1][filled])
+    spread /= safe.ravel()
+    return counts, centroids, spread
+
+
+def evaluate(facets, embedding, top=50, min_count=10):
+    """
+    Report rows for the top most common tags (top=0: every tag) with at
+    least min_count recipes, tightest first.
+    """
+    embedding = np.asarray(embedding, dtype=np.float64)
+    global_spread = np.mean(np.linalg.norm(embedding - embedding.mean(axis=0), axis=1))
+
+    counts, _, spread = tag_spread(incidence_matrix(facets), embedding)
+    # Most common first, ties by tag name like Counter.most_common on sorted input
+    order = np.lexsort((np.asarray(facets.tags), -counts))
+    if top:
+        order = order[:top]
+    results = []
+    for t in order[counts[order] >= min_count]:
+        results.append({
+            'Tag': facets.tags[t],
+            'Recipe_Count': int(counts[t]),
+            'Average_Spread': round(float(spread[t]), 4),
+            'Density_Score': round(float(global_spread / spread[t]) if spread[t] > 0 else 0.0, 4),
+        })
+    results.sort(key=lambda row: row['Density_Score'], reverse=True)
+    return results
+
+
+def legacy_evaluate(tag_lists, embedding, tags, min_count=10):
+    """
+    The per-tag loop from old_testing/v1.3/tag_variance.py, kept to check
+    and time the matrix version against.
+    """
+    global_spread = np.mean(np.linalg.norm(embedding - np.mean(embedding, axis=0), axis=1))
+    tag_indices = defaultdict(list)
+    for i, parsed_tags in enumerate(tag_lists):
+        for tag in set(parsed_tags):
+            tag_indices[tag].append(i)
+
+    results = {}
+    for target_tag in tags:
+        indices = tag_indices[target_tag]
+        if len(indices) < min_count:
+            continue
+        cluster_points = embedding[indices]
+        centroid = np.mean(cluster_points, axis=0)
+        avg_distance = np.mean(np.linalg.norm(cluster_points - centroid, axis=1))
+        results[target_tag] = global_spread / avg_distance if avg_distance > 0 else 0
+    return results
+
+
+def compare(facets, embedding, min_count):
+    # Tag lists per recipe, as the old script had them after parsing
+    by_row = incidence_matrix(facets).tocsr()
+    tag_lists = [[facets.tags[t] for t in by_row.indices[by_row.indptr[i]:by_row.indptr[i + 1]]]
+                 for i in range(by_row.shape[0])]
+    embedding = np.asarray(embedding, dtype=np.float64)
+
+    start = time.perf_counter()
+    expected = legacy_evaluate(tag_lists, embedding, facets.tags, min_count)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = evaluate(facets, embedding, top=0, min_count=min_count)
+    matrix_time = time.perf_counter() - start
+
+    worst = max((abs(round(expected[row['Tag']], 4) - row['Density_Score']) for row in results), default=0.0)
+    print(f"\nAll {len(results)} tags with >= {min_count} recipes:")
+    print(f"  per-tag loop:      {legacy_time:.3f}s")
+    print(f"  incidence matrix:  {matrix_time:.3f}s ({legacy_time / max(matrix_time, 1e-9):.1f}x), "
+          f"same tags: {set(expected) == {row['Tag'] for row in results}}, max density difference {worst:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intra-cluster variance of every tag in the galaxy")
+    parser.add_argument("--index-dir", default="galaxy_index", help="index saved by test5.py (--limit 0 = whole dataset)")
+    parser.add_argument("--top", type=int, default=50, help="most common tags to report, 0 = all of them")
+    parser.add_argument("--min-count", type=int, default=10, help="skip tags on fewer recipes than this")
+    parser.add_argument("--output", default="tag_variance_report.csv")
+    parser.add_argument("--compare", action="store_true", help="also time the old per-tag loop on the same tags")
+    args = parser.parse_args()
+
+    print(f"Loading index from {args.index_dir}")
+    galaxy = artifacts.load_index(args.index_dir)
+    facets, embedding = galaxy['facets'], galaxy['embedding']
+
+    print(f"Calculating intra-cluster variance for {args.top or 'all'} tags over {len(facets)} recipes")
+    start = time.perf_counter()
+    results = evaluate(facets, embedding, args.top, args.min_count)
+    print(f"  done in {time.perf_counter() - start:.3f}s")
+
+    with open(args.output, mode="w", newline="", encoding="utf-8") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nEvaluation saved to '{args.output}'.")
+
+    print("\nTop 10 Most Valid Culinary Clusters:")
+    print(f"{'TAG':<25} | {'COUNT':<10} | {'DENSITY SCORE'}")
+    print("-" * 55)
+    for row in results[:10]:
+        print(f"{row['Tag']:<25} | {row['Recipe_Count']:<10} | {row['Density_Score']}x Baseline")
+
+    if args.compare:
+        compare(facets, embedding, args.min_count)
+
+
+if __name__ == "__main__":
+    main()
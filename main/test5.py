@@ -1,116 +1,405 @@
-import csv
-import ast
+import os
+import sys
 import json
+import argparse
+import tempfile
 import numpy as np
-import umap
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-print("Loading data")
-raw_data = []
-
-with open("../data/RAW_recipes.csv", mode="r", encoding="utf-8") as file:
-    reader = csv.DictReader(file)
-    for i, row in enumerate(reader):
-        if i >= 5000: break  # small for the local demo
-        raw_data.append(row)
-
-
-TAG_ONTOLOGY = {
-    # Plant-Based (Greens)
-    'vegan':       {'cluster': 'Vegan Sector',       'color': '#00ff00'}, 
-    'vegetarian':  {'cluster': 'Vegetarian Sector',  'color': '#228b22'}, 
-    
-    # Baking & Sweets (Purples & Pinks)
-    'dessert':     {'cluster': 'Dessert Core',       'color': '#ff00ff'}, 
-    'baking':      {'cluster': 'Baking Sector',      'color': '#9370db'}, 
-    'cookie':      {'cluster': 'Cookie Cluster',     'color': '#ffb6c1'}, 
-    
-    # World Cuisine (Warm Colors: Reds, Oranges, Yellows)
-    'mexican':     {'cluster': 'Mexican Cuisine',    'color': '#ff4500'}, 
-    'asian':       {'cluster': 'Asian Cuisine',      'color': '#ff8c00'}, 
-    'indian':      {'cluster': 'Indian Cuisine',     'color': '#ffd700'}, 
-    'italian':     {'cluster': 'Italian Cuisine',    'color': '#dc143c'}, 
-    
-    # Core Proteins (Blues)
-    'seafood':     {'cluster': 'Seafood System',     'color': '#00ffff'}, 
-    'poultry':     {'cluster': 'Poultry System',     'color': '#1e90ff'}, 
-    'beef':        {'cluster': 'Beef System',        'color': '#000080'}, 
-}
-
-def assign_ontology(tags_list):
+import scipy.sparse as sp
+
+import artifacts
+import cache
+from ann import AnnIndex
+from compact import TokenCodes
+from export import export_galaxy
+from features import TFIDF_PARAMS, featurize_chunk, fit_tfidf
+from hashing import HashingTfidf, N_FEATURES
+from ingest import iter_chunks
+from neighbors import EXACT_ROWS, NEIGHBOR_K, neighbor_table
+from normalize import pretokenized
+from ontology import ONTOLOGY
+from parallel import iter_feature_chunks
+from profiling import BuildProfile
+from projection import neighbor_report, sample_fit, TRANSFORM_BATCH
+
+UMAP_PARAMS = dict(n_components=3, n_neighbors=15, min_dist=0.1, metric='cosine', random_state=42)
+
+# Stage names in the timing report, build and --append share them
+STAGES = ["load", "vectorize", "umap", "umap-report", "ann", "neighbors", "export", "index"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the recipe galaxy")
+    parser.add_argument("--data", default="../data/RAW_recipes.csv", help="path to RAW_recipes.csv")
+    parser.add_argument("--limit", type=int, default=5000,
+                        help="max recipes to read (0 = whole dataset, 5000 keeps the local demo small)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="recipes held in memory per chunk")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing and featurizing the CSV (1 = serial, same output either way)")
+    parser.add_argument("--vectorizer", choices=["tfidf", "hashing"], default="tfidf",
+                        help="hashing streams the TF-IDF fit chunk by chunk for corpora too big for memory")
+    parser.add_argument("--compact", action="store_true",
+                        help="hold the corpus as int32 token codes and a float32 TF-IDF matrix, half the memory")
+    parser.add_argument("--ann", action="store_true",
+                        help="also build the approximate nearest-neighbor index (server.py --ann)")
+    parser.add_argument("--neighbors", type=int, default=NEIGHBOR_K,
+                        help=f"similar recipes kept per recipe for the viewer (0 = none). Up to {EXACT_ROWS} "
+                             "recipes every pair is scored (about 5s for 10k, 40s for 30k), above that only "
+                             "IVF candidates are, which fits an ANN index unless --ann already did")
+    parser.add_argument("--out", default="galaxy", help="folder index2.html loads the galaxy from")
+    parser.add_argument("--index-dir", default="galaxy_index", help="saved artifacts for the search server")
+    parser.add_argument("--append", action="store_true",
+                        help="add the recipes in --data to the saved galaxy instead of rebuilding it")
+    parser.add_argument("--drift-threshold", type=float, default=0.05,
+                        help="with --append, refit everything when the new rows have this much more "
+                             "out-of-vocabulary tokens than the fitted corpus")
+    parser.add_argument("--umap-sample", type=int, default=0,
+                        help="fit UMAP on this many rows balanced across galaxy clusters and project the rest "
+                             "with --workers processes (0 = fit on every row)")
+    parser.add_argument("--umap-batch", type=int, default=TRANSFORM_BATCH, help="rows per UMAP transform batch")
+    parser.add_argument("--umap-report", action="store_true",
+                        help="report trustworthiness and neighbor preservation against a full UMAP fit")
+    parser.add_argument("--no-cache", action="store_true", help="refit TF-IDF and UMAP even if cached")
+    parser.add_argument("--cache-dir", default=".galaxy_cache", help="where fitted stages are stored")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="evict old cache entries above this size")
+    parser.add_argument("--report-dir", default=".galaxy_reports",
+                        help="stage timing reports and their history (compare runs with profile_diff.py)")
+    parser.add_argument("--profile", choices=STAGES,
+                        help="dump cProfile and tracemalloc output for this stage into --report-dir")
+    args = parser.parse_args()
+    args.limit = args.limit or None
+    return args
+
+
+def make_source(path, limit):
+    return {'path': os.path.abspath(path), 'limit': limit, 'digest': cache.file_digest(path)}
+
+
+def load_sources(sources, args, known_ids=None, consume=None):
+    """
+    Parses and featurizes every source CSV in order. Returns the token
+    lists, the cluster ids and a spool holding the recipes for the export.
+    Recipes whose id is in known_ids or in an earlier source are skipped.
+    With consume, each chunk's token lists go to it instead of the list.
+    """
+    rows = 0
+    master_features = []
+    cluster_chunks = []
+    spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    track_ids = known_ids is not None or len(sources) > 1
+    known_ids = set(known_ids or ())
+
+    # Only the token lists and cluster ids stay in memory,
+    # the parsed recipes are spooled to disk and dropped chunk by chunk.
+    # Workers split the CSV by byte range, chunks come back in file order.
+    for source in sources:
+        if args.workers > 1:
+            chunks = iter_feature_chunks(source['path'], args.workers, source['limit'])
+        else:
+            chunks = map(featurize_chunk, iter_chunks(source['path'], args.chunk_size, source['limit']))
+        start = rows
+        source_ids = set()
+        for tokens, ids, spool_text in chunks:
+            if track_ids:
+                tokens, ids, spool_text = drop_known(known_ids, tokens, ids, spool_text, source_ids)
+            spool.write(spool_text)
+            if consume is None:
+                master_features.extend(tokens)
+            else:
+                consume(tokens)
+            cluster_chunks.append(ids)
+            rows += len(ids)
+            print(f"  {rows} recipes")
+        source['rows'] = rows - start
+        known_ids |= source_ids
+
+    cluster_ids = np.concatenate(cluster_chunks) if cluster_chunks else np.empty(0, dtype=np.uint8)
+    return master_features, cluster_ids, spool
+
+
+def drop_known(known_ids, tokens, cluster_ids, spool_text, source_ids):
+    """
+    Filters one featurized chunk down to the recipes not in known_ids and
+    adds the ids it keeps to source_ids. Re-exported dumps then only add
+    what is actually new.
+    """
+    lines = spool_text.splitlines(keepends=True)
+    keep = [json.loads(line)[0] not in known_ids for line in lines]
+    source_ids.update(json.loads(line)[0] for line, new in zip(lines, keep) if new)
+    if all(keep):
+        return tokens, cluster_ids, spool_text
+    print(f"  skipping {keep.count(False)} recipes already in the galaxy")
+    return ([row for row, new in zip(tokens, keep) if new],
+            cluster_ids[np.asarray(keep, dtype=bool)],
+            "".join(line for line, new in zip(lines, keep) if new))
+
+
+def oov_rate(vectorizer, token_lists):
+    """
+    Share of feature tokens the fitted vocabulary does not know. min_df
+    drops rare terms so this is never zero, only its growth means drift.
+    """
+    if isinstance(vectorizer, HashingTfidf):
+        return vectorizer.oov_rate(token_lists)
+    vocabulary = set(vectorizer.get_feature_names_out())
+    total = sum(len(tokens) for tokens in token_lists)
+    missing = sum(token not in vocabulary for tokens in token_lists for token in tokens)
+    return missing / total if total else 0.0
+
+
+def build(args, sources, profile):
+    hashed = args.vectorizer == "hashing"
+    # The dtype goes into the manifest and every cache key
+    params = dict(TFIDF_PARAMS, dtype="float32") if args.compact else TFIDF_PARAMS
+    with profile.stage("load", "Loading data") as info:
+        if hashed:
+            # Token lists are counted and spooled chunk by chunk, never all held
+            vectorizer = HashingTfidf(**params)
+            work_dir = tempfile.TemporaryDirectory(prefix="galaxy-tfidf-")
+            master_features, cluster_ids, spool = load_sources(sources, args, consume=vectorizer.partial_fit)
+        elif args.compact:
+            # int32 codes per chunk instead of a token list per recipe
+            master_features = TokenCodes()
+            _, cluster_ids, spool = load_sources(sources, args, consume=master_features.add)
+            profile.structure("token codes", master_features)
+        else:
+            master_features, cluster_ids, spool = load_sources(sources, args)
+            profile.structure("token lists", master_features)
+        info['rows'] = len(cluster_ids)
+
+    # Cache keys cover the input bytes, the row range and every hyperparameter
+    use_cache = not args.no_cache
+    if use_cache:
+        digests = [source['digest'] for source in sources]
+        data_digest = digests[0] if len(digests) == 1 else cache.stage_key(*digests)
+        engine_params = dict(params, engine="hashing", n_features=N_FEATURES) if hashed else params
+        tfidf_key = cache.stage_key(data_digest, [0, len(cluster_ids)], engine_params, cache.FEATURE_VERSION)
+        full_key = cache.stage_key(tfidf_key, UMAP_PARAMS)
+    sampled = 0 < args.umap_sample < len(cluster_ids)
+    if use_cache:
+        umap_key = cache.stage_key(tfidf_key, UMAP_PARAMS, dict(sample=args.umap_sample, batch=args.umap_batch)) \
+            if sampled else full_key
+
+    with profile.stage("vectorize", "Vectorizing") as info:
+        info['rows'] = len(cluster_ids)
+        cached = cache.load_tfidf(args.cache_dir, tfidf_key, params) if use_cache else None
+        info['cache_hit'] = bool(cached)
+        if cached:
+            print("  cache hit, skipping fit")
+            if hashed:
+                vectorizer.close()
+            vectorizer, tfidf_matrix = cached
+        elif hashed:
+            tfidf_matrix = vectorizer.finish(work_dir.name)
+            if use_cache:
+                cache.save_tfidf(args.cache_dir, tfidf_key, vectorizer, tfidf_matrix)
+        elif args.compact:
+            vectorizer, tfidf_matrix = master_features.fit_tfidf(TFIDF_PARAMS)
+            if use_cache:
+                cache.save_tfidf(args.cache_dir, tfidf_key, vectorizer, tfidf_matrix)
+        else:
+            vectorizer, tfidf_matrix = fit_tfidf(master_features)
+            if use_cache:
+                cache.save_tfidf(args.cache_dir, tfidf_key, vectorizer, tfidf_matrix)
+        if hashed:
+            baseline_oov = vectorizer.oov_rate_
+        elif args.compact:
+            baseline_oov = master_features.oov_rate(vectorizer)
+        else:
+            baseline_oov = oov_rate(vectorizer, master_features)
+        del master_features
+        profile.structure("tfidf matrix", tfidf_matrix)
+
+    with profile.stage("umap", "Running UMAP projection") as info:
+        info['rows'] = len(cluster_ids)
+        reducer = None
+        embedding_3d = cache.load_embedding(args.cache_dir, umap_key) if use_cache else None
+        info['cache_hit'] = embedding_3d is not None
+        if embedding_3d is not None:
+            print("  cache hit, skipping fit")
+        else:
+            if sampled:
+                print(f"  fitting on {args.umap_sample} rows, transforming the other {len(cluster_ids) - args.umap_sample}")
+                reducer, embedding_3d, _ = sample_fit(tfidf_matrix, cluster_ids, args.umap_sample, UMAP_PARAMS,
+                                                      args.umap_batch, args.workers)
+            else:
+                # umap pulls in numba and its JIT, only a fit that actually runs imports it
+                import umap
+                reducer = umap.UMAP(**UMAP_PARAMS)
+
+                # UMAP returns a pure Numpy array (Shape: rows x 3 columns)
+                embedding_3d = reducer.fit_transform(tfidf_matrix)
+            if use_cache:
+                cache.save_umap(args.cache_dir, umap_key, reducer, embedding_3d)
+        # Every consumer (export, store, tiles) wants float32 anyway
+        embedding_3d = np.asarray(embedding_3d, dtype=np.float32)
+        profile.structure("embedding", embedding_3d)
+        profile.structure("cluster ids", cluster_ids)
+
+    if args.umap_report:
+        with profile.stage("umap-report", "Comparing with a full UMAP fit") as info:
+            info['rows'] = len(cluster_ids)
+            full = embedding_3d if not sampled else None
+            if full is None and use_cache:
+                full = cache.load_embedding(args.cache_dir, full_key)
+            if full is None:
+                import umap
+                full_reducer = umap.UMAP(**UMAP_PARAMS)
+                full = full_reducer.fit_transform(tfidf_matrix)
+                if use_cache:
+                    cache.save_umap(args.cache_dir, full_key, full_reducer, full)
+            embeddings = {'full fit': full}
+            if sampled:
+                embeddings[f"sample fit ({args.umap_sample})"] = embedding_3d
+            info['neighbors'] = neighbor_report(tfidf_matrix, embeddings)
+            print(f"  {'EMBEDDING':<24} | {'TRUSTWORTHINESS':<15} | {'KNN KEPT'}")
+            for name, scores in info['neighbors'].items():
+                print(f"  {name:<24} | {scores['trustworthiness']:<15.4f} | {scores['knn_preservation']:.3f}")
+
+    ann = None
+    if args.ann:
+        with profile.stage("ann", "Building ANN index") as info:
+            info['rows'] = len(cluster_ids)
+            ann = AnnIndex.fit(tfidf_matrix)
+
+    neighbors = None
+    if args.neighbors:
+        with profile.stage("neighbors", "Finding similar recipes") as info:
+            info['rows'] = len(cluster_ids)
+            neighbors = neighbor_table(tfidf_matrix, args.neighbors, ann=ann)
+            profile.structure("neighbor table", neighbors)
+
+    with spool:
+        with profile.stage("export", "Exporting galaxy") as info:
+            info['rows'] = len(cluster_ids)
+            os.makedirs(args.out, exist_ok=True)
+            export_galaxy(args.out, spool, embedding_3d, cluster_ids, ONTOLOGY.palette, neighbors=neighbors)
+
+        with profile.stage("index", "Saving search index") as info:
+            info['rows'] = len(cluster_ids)
+            artifacts.save_index(args.index_dir, vectorizer, tfidf_matrix, embedding_3d,
+                                 cluster_ids, ONTOLOGY.palette, spool, params,
+                                 sources=sources, oov_rate=baseline_oov,
+                                 settings=dict(umap_sample=args.umap_sample, umap_batch=args.umap_batch,
+                                               neighbors=args.neighbors))
+            # Kept so --append can project new rows into this same space
+            artifacts.save_reducer(args.index_dir, reducer,
+                                   cache.reducer_path(args.cache_dir, umap_key) if use_cache else None)
+            artifacts.save_neighbors(args.index_dir, neighbors)
+            artifacts.save_ann(args.index_dir, ann)
+
+    if use_cache:
+        cache.evict(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if hashed:
+        work_dir.cleanup()
+
+    print("Data exported")
+
+
+def append(args, profile):
     """
-    Scans a recipe's tags and returns its assigned Cluster Name and Color.
+    Projects the recipes in --data into the saved galaxy with the fitted
+    vectorizer and reducer, so existing stars keep their coordinates.
+    Rebuilds from every source instead when the vocabulary has drifted.
     """
-    if not tags_list:
-        return 'Deep Space', '#444444' # Dark grey for uncategorized
-        
-    t_str = " ".join([t.lower() for t in tags_list])
-    
-    for target_tag, properties in TAG_ONTOLOGY.items():
-        if target_tag in t_str:
-            return properties['cluster'], properties['color']
-            
-    return 'General Savory Space', '#444444'
-
-
-prep_words = ['diced ', 'chopped ', 'crushed ', 'minced ', 'sliced ', 'ground ']
-master_features = []  
-
-for row in raw_data:
-    parsed_ingredients = ast.literal_eval(row['ingredients'])
-    parsed_tags = ast.literal_eval(row['tags'])
-    
-    cluster_name, star_color = assign_ontology(parsed_tags)
-    row['galaxy_cluster'] = cluster_name
-    row['star_color'] = star_color
-    
-    # Clean ingredients
-    ingreds = []
-    for item in parsed_ingredients:
-        for word in prep_words:
-            item = item.replace(word, "")
-        ingreds.append(item.strip().replace(" ", "_"))
-    
-    # Clean tags
-    tags = ["TAG_" + tag.replace(" ", "_") for tag in parsed_tags]
-    
-    master_features.append(" ".join(ingreds + tags))
-
-
-
-print("Vectorizing")
-vectorizer = TfidfVectorizer(max_df=0.90, min_df=5)
-tfidf_matrix = vectorizer.fit_transform(master_features)
-
-
-print("Running UMAP projection")
-reducer = umap.UMAP(n_components=3, n_neighbors=15, min_dist=0.1, metric='cosine', random_state=42)
-
-# UMAP returns a pure Numpy array (Shape: 5000 rows x 3 columns)
-embedding_3d = reducer.fit_transform(tfidf_matrix)
-
-print("Exporting JSON")
-export_data = []
-
-for i, row in enumerate(raw_data):
-    # Safely convert the raw strings into actual Python lists
-    clean_ingredients = ast.literal_eval(row['ingredients'])
-    clean_steps = ast.literal_eval(row['steps'])
-    
-    export_data.append({
-        'id': row['id'],
-        'name': row['name'].title(),
-        'x': float(embedding_3d[i, 0]),
-        'y': float(embedding_3d[i, 1]),
-        'z': float(embedding_3d[i, 2]),
-        'galaxy_cluster': row['galaxy_cluster'],
-        'star_color': row['star_color'],  
-        # Capitalize the first letter of each ingredient and step
-        'ingredients': [ing.capitalize() for ing in clean_ingredients],
-        'steps': [step.capitalize() for step in clean_steps]
-    })
-
-with open("galaxy_data.json", mode="w", encoding="utf-8") as outfile:
-    json.dump(export_data, outfile)
-
-print("Data exported")
\ No newline at end of file
+    with profile.stage("load", f"Loading index from {args.index_dir}") as info:
+        galaxy = artifacts.load_index(args.index_dir)
+        manifest = galaxy['manifest']
+        if 'sources' not in manifest or not os.path.exists(os.path.join(args.index_dir, "reducer.pkl")):
+            raise SystemExit(f"{args.index_dir} was built before --append existed, rebuild it once first")
+
+        source = make_source(args.data, args.limit)
+        if any(known['digest'] == source['digest'] for known in manifest['sources']):
+            raise SystemExit(f"{args.data} is already part of the galaxy")
+
+        print("Loading new recipes")
+        new_features, new_cluster_ids, spool = load_sources([source], args,
+                                                            known_ids=set(map(str, galaxy['ids'].tolist())))
+        info['rows'] = len(new_cluster_ids)
+    if not new_features:
+        spool.close()
+        print("Nothing to append")
+        return
+
+    vectorizer = galaxy['vectorizer']
+    drift = oov_rate(vectorizer, new_features) - manifest['oov_rate']
+    print(f"  vocabulary drift {drift:+.3f} (threshold {args.drift_threshold})")
+    if drift > args.drift_threshold:
+        spool.close()
+        print("Vocabulary drifted, refitting the whole galaxy")
+        args.vectorizer = "hashing" if isinstance(vectorizer, HashingTfidf) else "tfidf"
+        args.compact = manifest['tfidf_params'].get('dtype') == "float32"
+        args.ann = artifacts.load_ann(args.index_dir) is not None
+        settings = manifest.get('settings')
+        if settings is None:
+            # Built before the manifest kept its settings: the saved table still
+            # tells its k, the UMAP flags stay as passed
+            table = artifacts.load_neighbors(args.index_dir)
+            settings = dict(neighbors=table[0].shape[1] if table is not None else 0)
+        args.umap_sample = settings.get('umap_sample', args.umap_sample)
+        args.umap_batch = settings.get('umap_batch', args.umap_batch)
+        args.neighbors = settings['neighbors']
+        # The stored digests are from the last build, a source edited since
+        # must not pick up the cached TF-IDF or UMAP of its old contents
+        missing = [known['path'] for known in manifest['sources'] if not os.path.exists(known['path'])]
+        if missing:
+            raise SystemExit(f"can't refit, {missing[0]} is gone")
+        sources = [make_source(known['path'], known['limit']) for known in manifest['sources']]
+        build(args, sources + [source], profile)
+        return
+
+    rows = len(new_cluster_ids)
+    with profile.stage("vectorize", "Vectorizing") as info:
+        info['rows'] = rows
+        vectorizer.set_params(analyzer=pretokenized)
+        tfidf_rows = vectorizer.transform(new_features)
+        del new_features
+
+    with profile.stage("umap", "Running UMAP transform") as info:
+        info['rows'] = rows
+        embedding_rows = artifacts.load_reducer(args.index_dir).transform(tfidf_rows)
+
+    start_row = manifest['count']
+    ann = artifacts.load_ann(args.index_dir)
+    if ann is not None:
+        ann.add(tfidf_rows, start_row)
+    # Keeps the k the galaxy was built with, the old rows only get merged into
+    neighbors = artifacts.load_neighbors(args.index_dir)
+    if neighbors is not None:
+        with profile.stage("neighbors", "Finding similar recipes") as info:
+            info['rows'] = rows
+            neighbors = neighbor_table(sp.vstack([galaxy['tfidf_matrix'], tfidf_rows]),
+                                       neighbors[0].shape[1], previous=neighbors, ann=ann)
+
+    with spool:
+        with profile.stage("index", "Updating search index") as info:
+            info['rows'] = rows
+            cluster_ids = artifacts.append_index(galaxy, tfidf_rows, embedding_rows, new_cluster_ids, spool, source)
+            if ann is not None:
+                artifacts.save_ann(args.index_dir, ann)
+            artifacts.save_neighbors(args.index_dir, neighbors)
+
+        with profile.stage("export", "Exporting galaxy") as info:
+            info['rows'] = rows
+            os.makedirs(args.out, exist_ok=True)
+            export_galaxy(args.out, spool, np.vstack([galaxy['embedding'], embedding_rows]), cluster_ids,
+                          galaxy['palette'], start_row=start_row, neighbors=neighbors)
+
+    print(f"Appended {len(cluster_ids) - start_row} recipes, {len(cluster_ids)} total")
+
+
+def main():
+    args = parse_args()
+    profile = BuildProfile(args.report_dir, args.profile, command=" ".join(sys.argv[1:]))
+    if args.append:
+        append(args, profile)
+    else:
+        build(args, [make_source(args.data, args.limit)], profile)
+
+    profile.summary()
+    path = profile.save()
+    if path:
+        print(f"Timing report saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import unittest
+
+from ingest import iter_recipes
+from ontology import ONTOLOGY, TAG_ONTOLOGY, CompiledOntology, assign_ontology
+
+# The compiled ontology table must give every recipe exactly the cluster
+# the original assign_ontology scan gives it.
+#   python -m pytest test_ontology.py      (or python -m unittest test_ontology)
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sample_recipes.csv")
+
+EDGE_CASES = [
+    [],
+    [''],
+    ['easy'],
+    ['Ground-Beef'],                                  # substring and case
+    ['30-minutes-or-less', 'VEGAN'],
+    ['non-vegetarian'],                               # 'vegetarian' still matches inside it
+    ['cookies-and-brownies'],
+    ['beef', 'vegan'],                                # dict order decides, not tag order
+    ['vegan', 'beef'],
+    ['poultry', 'seafood', 'italian', 'asian'],
+    ['mexican-appetizers', 'dessert'],
+    ['time-to-make', 'course', 'main-ingredient'],
+    ['indian'] * 3,                                   # duplicate tags
+]
+
+
+class CompiledOntologyTest(unittest.TestCase):
+
+    def assert_same(self, ontology, tag_lists, reference=assign_ontology):
+        ids = ontology.assign_ids(tag_lists)
+        self.assertEqual(ids.dtype.name, "uint8")
+        for tags, cluster_id in zip(tag_lists, ids):
+            expected = reference(tags)
+            self.assertEqual(ontology.assign(tags), expected, tags)
+            label = ontology.palette[cluster_id]
+            self.assertEqual((label['name'], label['color']), expected, tags)
+
+    def test_edge_cases(self):
+        self.assert_same(CompiledOntology(), EDGE_CASES)
+
+    def test_empty_lists_between_and_after_tagged_ones(self):
+        # assign_ids reduces over runs of tags, empty recipes must not shift them
+        self.assert_same(CompiledOntology(), [[], ['beef'], [], [], ['vegan', 'easy'], []])
+        self.assert_same(CompiledOntology(), [[], []])
+        self.assert_same(CompiledOntology(), [])
+
+    def test_memoized_tags_give_the_same_answer(self):
+        ontology = CompiledOntology()
+        self.assert_same(ontology, EDGE_CASES)
+        self.assert_same(ontology, EDGE_CASES[::-1])
+
+    def test_sample_data(self):
+        tag_lists = [recipe.tags for recipe in iter_recipes(SAMPLE)]
+        self.assertTrue(tag_lists)
+        self.assert_same(CompiledOntology(), tag_lists)
+        self.assert_same(ONTOLOGY, tag_lists)
+
+    def test_custom_ontology_keeps_its_order(self):
+        ontology = {'beef': {'cluster': 'Beef', 'color': '#000001'},
+                    'vegan': {'cluster': 'Vegan', 'color': '#000002'}}
+
+        def reference(tags):
+            if not tags:
+                return 'Deep Space', '#444444'
+            joined = " ".join(tag.lower() for tag in tags)
+            for target, properties in ontology.items():
+                if target in joined:
+                    return properties['cluster'], properties['color']
+            return 'General Savory Space', '#444444'
+
+        self.assert_same(CompiledOntology(ontology), EDGE_CASES, reference)
+
+    def test_targets_with_spaces_are_refused(self):
+        with self.assertRaises(ValueError):
+            CompiledOntology(dict(TAG_ONTOLOGY, **{'ground beef': {'cluster': 'Beef', 'color': '#000080'}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
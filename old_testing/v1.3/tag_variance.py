@@ -1,10 +1,14 @@
+import os
+import sys
 import csv
-import ast
 import numpy as np
 import umap
-from collections import Counter
+from collections import Counter, defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "main"))
+from parsing import parse_list
+
 def run_evaluation():
     print("Loading raw data for testing...")
     raw_data = []
@@ -14,17 +18,15 @@ def run_evaluation():
         reader = csv.DictReader(file)
         for i, row in enumerate(reader):
             if i >= 5000: break  # Keep the test set identical to the demo size
-            raw_data.append(row)
-            all_tags_raw.extend(ast.literal_eval(row['tags']))
+            # Decode the list columns once and keep them
+            raw_data.append((parse_list(row['ingredients']), parse_list(row['tags'])))
+            all_tags_raw.extend(raw_data[-1][1])
 
     print("Building feature matrix...")
     prep_words = ['diced ', 'chopped ', 'crushed ', 'minced ', 'sliced ', 'ground ']
     master_features = []
     
-    for row in raw_data:
-        parsed_ingredients = ast.literal_eval(row['ingredients'])
-        parsed_tags = ast.literal_eval(row['tags'])
-        
+    for parsed_ingredients, parsed_tags in raw_data:
         ingreds = [item.replace(w, "") for item in parsed_ingredients for w in prep_words]
         ingreds = [item.strip().replace(" ", "_") for item in ingreds]
         tags = ["TAG_" + tag.replace(" ", "_") for tag in parsed_tags]
@@ -45,10 +47,16 @@ def run_evaluation():
     global_centroid = np.mean(embedding_3d, axis=0)
     global_spread = np.mean(np.linalg.norm(embedding_3d - global_centroid, axis=1))
 
+    # One pass over the parsed tags instead of re-parsing every row per tag
+    tag_indices = defaultdict(list)
+    for i, (_, parsed_tags) in enumerate(raw_data):
+        for tag in set(parsed_tags):
+            tag_indices[tag].append(i)
+
     results = []
     for target_tag in top_50_tags:
         # Find indices of all recipes containing this tag
-        indices = [i for i, row in enumerate(raw_data) if target_tag in ast.literal_eval(row['tags'])]
+        indices = tag_indices[target_tag]
         
         if len(indices) < 10: 
             continue